@@ -1,21 +1,145 @@
 import os
 import re
 import lzma
+import mmap
 import base64
-import json
+import codecs
 import platform
 import argparse
 import sys
+import stat
+import time
+import traceback
 import hashlib
 import datetime
 import zlib
 import bz2
+import itertools
+import shutil
+import threading
+from collections import deque
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# 可选依赖：pybase64 提供SIMD加速的base64编解码，接口与标准库一致，未安装时回退到标准库
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# 可选依赖：zstandard 支持多线程压缩，安装后流式压缩默认使用ZSTD
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 运行平台在导入时确定一次，避免每次调用都查询
+IS_WINDOWS = platform.system() == 'Windows'
+
+# 原始数据超过该大小时，压缩快照改为流式写入，不再在内存中拼接整个快照
+STREAM_COMPRESSION_THRESHOLD = 64 * 1024 * 1024
+
+# 写快照时的缓冲区大小，条目头和小文件内容在缓冲区中合并后再写入，减少系统调用次数
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# 不超过该大小的文件会由工作线程提前整体读入，更大的文件仍在写入时分块读取
+PREFETCH_MAX_FILE_SIZE = 1024 * 1024
+
+# Windows原生读取时，不小于该大小的文件改用内存映射读取
+WINDOWS_MMAP_THRESHOLD = 64 * 1024
+
+# windows_fast_file_read为每个线程保留一个读缓冲区，在该线程读取的各个小文件之间复用
+_thread_read_buffer = threading.local()
+
+# ZLIB_ULTRA使用的预置字典（快照格式标记和常见的代码片段），压缩和解压必须使用同一份内容
+_ZLIB_DICTIONARY = b''.join([
+    b'@', b'\n', b'B\n', b'[EMPTY_DIRECTORY]', b'def ', b'class ',
+    b'import ', b'from ', b'function', b'var ', b'const ',
+    b'<html>', b'<head>', b'<body>', b'</html>', b'</head>', b'</body>',
+    b'<?xml', b'encoding=', b'utf-8', b'<!DOCTYPE',
+    b'{', b'}', b'[', b']', b'(', b')', b';', b',', b':', b'"'
+])
+
+# 流式压缩的默认压缩级别
+DEFAULT_LZMA_PRESET = 6
+DEFAULT_ZSTD_LEVEL = 19
+
+# 按原始数据大小选择ZSTD级别：级别19每次创建压缩上下文就要几十毫秒，极小的输入改用低级别；
+# 达到流式压缩阈值的大体积输入改用级别10，压缩时间大幅缩短而压缩率只略有下降
+SMALL_INPUT_SIZE = 4096
+SMALL_INPUT_ZSTD_LEVEL = 3
+LARGE_INPUT_ZSTD_LEVEL = 10
+
+# Windows原生API的结构体和函数原型只在导入时声明一次，各函数直接使用；不可用时 _kernel32 为None
+_kernel32 = None
+if IS_WINDOWS:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        # HANDLE返回值是无符号指针，需与同类型的-1比较
+        _INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+        _MAX_PATH = 260
+
+        # 定义Windows结构体
+        class _FILETIME(ctypes.Structure):
+            _fields_ = [("dwLowDateTime", wintypes.DWORD),
+                       ("dwHighDateTime", wintypes.DWORD)]
+
+        class _WIN32_FIND_DATAW(ctypes.Structure):
+            _fields_ = [("dwFileAttributes", wintypes.DWORD),
+                       ("ftCreationTime", _FILETIME),
+                       ("ftLastAccessTime", _FILETIME),
+                       ("ftLastWriteTime", _FILETIME),
+                       ("nFileSizeHigh", wintypes.DWORD),
+                       ("nFileSizeLow", wintypes.DWORD),
+                       ("dwReserved0", wintypes.DWORD),
+                       ("dwReserved1", wintypes.DWORD),
+                       ("cFileName", wintypes.WCHAR * _MAX_PATH),
+                       ("cAlternateFileName", wintypes.WCHAR * 14)]
+
+        _kernel32 = ctypes.windll.kernel32
+
+        # 目录枚举，使用宽字符版本直接得到Unicode文件名
+        _FindFirstFileEx = _kernel32.FindFirstFileExW
+        _FindFirstFileEx.argtypes = [wintypes.LPCWSTR, ctypes.c_int, ctypes.POINTER(_WIN32_FIND_DATAW),
+                                     ctypes.c_int, wintypes.LPVOID, wintypes.DWORD]
+        _FindFirstFileEx.restype = wintypes.HANDLE
+
+        _FindNextFile = _kernel32.FindNextFileW
+        _FindNextFile.argtypes = [wintypes.HANDLE, ctypes.POINTER(_WIN32_FIND_DATAW)]
+        _FindNextFile.restype = wintypes.BOOL
+
+        _FindClose = _kernel32.FindClose
+        _FindClose.argtypes = [wintypes.HANDLE]
+        _FindClose.restype = wintypes.BOOL
+
+        # 文件读取，同样使用宽字符版本，非ASCII路径无需经过系统代码页转换
+        _CreateFile = _kernel32.CreateFileW
+        _CreateFile.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD,
+                                wintypes.LPVOID, wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        _CreateFile.restype = wintypes.HANDLE
+
+        _ReadFile = _kernel32.ReadFile
+        _ReadFile.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD,
+                              ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID]
+        _ReadFile.restype = wintypes.BOOL
+
+        _GetFileSizeEx = _kernel32.GetFileSizeEx
+        _GetFileSizeEx.argtypes = [wintypes.HANDLE, ctypes.POINTER(ctypes.c_int64)]
+        _GetFileSizeEx.restype = wintypes.BOOL
+
+        _CloseHandle = _kernel32.CloseHandle
+        _CloseHandle.argtypes = [wintypes.HANDLE]
+        _CloseHandle.restype = wintypes.BOOL
+    except (ImportError, AttributeError, OSError):
+        _kernel32 = None
+
 
 def optimize_for_windows():
     """Windows平台特定优化 - 使用原生接口"""
-    if platform.system() != 'Windows':
+    if not IS_WINDOWS:
         return False
 
     try:
@@ -30,12 +154,11 @@ def optimize_for_windows():
 
         # 2. Windows原生文件API优化
         try:
-            import ctypes
-            from ctypes import wintypes
+            if _kernel32 is None:
+                raise OSError("kernel32 不可用")
 
             # 获取Windows版本信息
-            kernel32 = ctypes.windll.kernel32
-            version = kernel32.GetVersion()
+            version = _kernel32.GetVersion()
             major_version = version & 0xFF
 
             if major_version >= 6:  # Vista及以上
@@ -66,98 +189,69 @@ def windows_fast_file_enumeration(directory_path):
     """
     使用Windows原生API快速枚举文件
     比os.walk()快2-3倍
+
+    :return: (相对路径, 完整路径, 是否为目录) 列表，目录标志直接来自枚举得到的文件属性；失败时返回None
     """
-    if platform.system() != 'Windows':
+    if not IS_WINDOWS or _kernel32 is None:
         return None
 
     try:
-        import ctypes
-        from ctypes import wintypes
-        import os
-
         # Windows API常量
-        INVALID_HANDLE_VALUE = -1
         FILE_ATTRIBUTE_DIRECTORY = 0x10
-        MAX_PATH = 260
-
-        # 定义Windows结构体
-        class FILETIME(ctypes.Structure):
-            _fields_ = [("dwLowDateTime", wintypes.DWORD),
-                       ("dwHighDateTime", wintypes.DWORD)]
-
-        class WIN32_FIND_DATA(ctypes.Structure):
-            _fields_ = [("dwFileAttributes", wintypes.DWORD),
-                       ("ftCreationTime", FILETIME),
-                       ("ftLastAccessTime", FILETIME),
-                       ("ftLastWriteTime", FILETIME),
-                       ("nFileSizeHigh", wintypes.DWORD),
-                       ("nFileSizeLow", wintypes.DWORD),
-                       ("dwReserved0", wintypes.DWORD),
-                       ("dwReserved1", wintypes.DWORD),
-                       ("cFileName", wintypes.CHAR * MAX_PATH),
-                       ("cAlternateFileName", wintypes.CHAR * 14)]
-
-        # Windows API函数
-        kernel32 = ctypes.windll.kernel32
-        FindFirstFile = kernel32.FindFirstFileA
-        FindFirstFile.argtypes = [wintypes.LPCSTR, ctypes.POINTER(WIN32_FIND_DATA)]
-        FindFirstFile.restype = wintypes.HANDLE
-
-        FindNextFile = kernel32.FindNextFileA
-        FindNextFile.argtypes = [wintypes.HANDLE, ctypes.POINTER(WIN32_FIND_DATA)]
-        FindNextFile.restype = wintypes.BOOL
-
-        FindClose = kernel32.FindClose
-        FindClose.argtypes = [wintypes.HANDLE]
-        FindClose.restype = wintypes.BOOL
+        FIND_EX_INFO_BASIC = 1  # 不生成8.3短文件名
+        FIND_EX_SEARCH_NAME_MATCH = 0
+        FIND_FIRST_EX_LARGE_FETCH = 2  # 使用更大的目录读取缓冲区
 
         files_to_process = []
-        directories_to_scan = [directory_path]
         base_path = os.path.normpath(directory_path)
+        directories_to_scan = deque([base_path])
+        # 子路径都由 base_path 逐级拼接而来，相对路径直接切片得到
+        base_len = len(base_path) if base_path.endswith(os.sep) else len(base_path) + 1
 
         print_colored("🚀 使用Windows原生API快速文件扫描...", 'blue')
 
         while directories_to_scan:
-            current_dir = directories_to_scan.pop(0)
-            search_path = os.path.join(current_dir, "*").encode('utf-8')
+            current_dir = directories_to_scan.popleft()
+            search_path = os.path.join(current_dir, "*")
 
-            find_data = WIN32_FIND_DATA()
-            handle = FindFirstFile(search_path, ctypes.byref(find_data))
+            find_data = _WIN32_FIND_DATAW()
+            handle = _FindFirstFileEx(search_path, FIND_EX_INFO_BASIC, ctypes.byref(find_data),
+                                     FIND_EX_SEARCH_NAME_MATCH, None, FIND_FIRST_EX_LARGE_FETCH)
 
-            if handle == INVALID_HANDLE_VALUE:
+            if handle == _INVALID_HANDLE_VALUE:
                 continue
 
+            # 目录是否为空在扫描它自身时顺带得到，无需对每个子目录再做一次os.listdir
+            entry_count = 0
             try:
                 while True:
-                    filename = find_data.cFileName.decode('utf-8', errors='ignore')
+                    filename = find_data.cFileName
 
                     # 跳过. 和 ..
                     if filename in ('.', '..'):
-                        if not FindNextFile(handle, ctypes.byref(find_data)):
+                        if not _FindNextFile(handle, ctypes.byref(find_data)):
                             break
                         continue
 
+                    entry_count += 1
                     full_path = os.path.join(current_dir, filename)
-                    relative_path = os.path.relpath(full_path, start=base_path).replace(os.sep, '/')
 
                     if find_data.dwFileAttributes & FILE_ATTRIBUTE_DIRECTORY:
                         # 是目录
                         directories_to_scan.append(full_path)
-                        # 检查是否为空目录
-                        try:
-                            if not os.listdir(full_path):
-                                files_to_process.append((relative_path, full_path))
-                        except (OSError, PermissionError):
-                            pass
                     else:
                         # 是文件
-                        files_to_process.append((relative_path, full_path))
+                        files_to_process.append((full_path[base_len:].replace(os.sep, '/'), full_path, False))
 
-                    if not FindNextFile(handle, ctypes.byref(find_data)):
+                    if not _FindNextFile(handle, ctypes.byref(find_data)):
                         break
 
             finally:
-                FindClose(handle)
+                _FindClose(handle)
+
+            # 空的子目录作为单独的条目记录
+            if entry_count == 0 and current_dir != base_path:
+                files_to_process.append((current_dir[base_len:].replace(os.sep, '/'), current_dir, True))
 
         print_colored(f"✅ Windows原生API扫描完成，发现 {len(files_to_process)} 个项目", 'green')
         return files_to_process
@@ -173,82 +267,83 @@ def windows_fast_file_read(file_path, is_binary=False):
     使用Windows原生API快速读取文件
     比标准Python文件读取快20-30%
     """
-    if platform.system() != 'Windows':
+    if not IS_WINDOWS:
         return None
 
+    def decode_content(data):
+        if is_binary:
+            return bytes(data)
+        try:
+            return str(data, 'utf-8')
+        except UnicodeDecodeError:
+            # 编码失败，尝试其他编码
+            for encoding in ['cp1252', 'utf-16', 'latin1']:
+                try:
+                    return str(data, encoding)
+                except UnicodeDecodeError:
+                    continue
+            # 所有编码都失败，作为二进制返回
+            return bytes(data)
+
     try:
-        import ctypes
-        from ctypes import wintypes
+        # 大文件使用内存映射：由系统按需调入页面，不先分配整个文件大小的缓冲区再复制一次
+        if os.path.getsize(file_path) >= WINDOWS_MMAP_THRESHOLD:
+            fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                    return decode_content(mm)
+            finally:
+                os.close(fd)
+
+        if _kernel32 is None:
+            return None
 
         # Windows API常量
         GENERIC_READ = 0x80000000
         FILE_SHARE_READ = 0x00000001
         OPEN_EXISTING = 3
         FILE_ATTRIBUTE_NORMAL = 0x80
-        INVALID_HANDLE_VALUE = -1
-
-        # Windows API函数
-        kernel32 = ctypes.windll.kernel32
-
-        CreateFile = kernel32.CreateFileA
-        CreateFile.argtypes = [wintypes.LPCSTR, wintypes.DWORD, wintypes.DWORD,
-                              wintypes.LPVOID, wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
-        CreateFile.restype = wintypes.HANDLE
-
-        ReadFile = kernel32.ReadFile
-        ReadFile.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD,
-                            ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID]
-        ReadFile.restype = wintypes.BOOL
-
-        GetFileSizeEx = kernel32.GetFileSizeEx
-        GetFileSizeEx.argtypes = [wintypes.HANDLE, ctypes.POINTER(ctypes.c_int64)]
-        GetFileSizeEx.restype = wintypes.BOOL
-
-        CloseHandle = kernel32.CloseHandle
-        CloseHandle.argtypes = [wintypes.HANDLE]
-        CloseHandle.restype = wintypes.BOOL
+        FILE_FLAG_SEQUENTIAL_SCAN = 0x08000000  # 提示缓存管理器按顺序读取，加大预读
+        READ_CHUNK_SIZE = 1024 * 1024
 
         # 打开文件
-        file_path_bytes = file_path.encode('utf-8')
-        handle = CreateFile(file_path_bytes, GENERIC_READ, FILE_SHARE_READ,
-                           None, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, None)
+        handle = _CreateFile(file_path, GENERIC_READ, FILE_SHARE_READ,
+                            None, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL | FILE_FLAG_SEQUENTIAL_SCAN, None)
 
-        if handle == INVALID_HANDLE_VALUE:
+        if handle == _INVALID_HANDLE_VALUE:
             return None
 
         try:
             # 获取文件大小
             file_size = ctypes.c_int64()
-            if not GetFileSizeEx(handle, ctypes.byref(file_size)):
-                return None
-
-            # 如果文件太大，回退到标准方法
-            if file_size.value > 50 * 1024 * 1024:  # 50MB
+            if not _GetFileSizeEx(handle, ctypes.byref(file_size)):
                 return None
 
-            # 读取文件内容
-            buffer = ctypes.create_string_buffer(file_size.value)
+            # 读取文件内容：按不超过1MB的块依次读入预先分配的缓冲区，ReadFile读到的字节数少于请求时继续读
+            # 走到这里的文件都小于内存映射阈值，复用当前线程的缓冲区，不再为每个文件分配一次；
+            # decode_content返回的是复制出的bytes/str，缓冲区可以直接给下一个文件使用
+            buffer = getattr(_thread_read_buffer, 'buffer', None)
+            if buffer is None:
+                buffer = _thread_read_buffer.buffer = ctypes.create_string_buffer(WINDOWS_MMAP_THRESHOLD)
+            if file_size.value > len(buffer):
+                buffer = ctypes.create_string_buffer(file_size.value)
             bytes_read = wintypes.DWORD()
+            total_read = 0
+
+            while total_read < file_size.value:
+                to_read = min(READ_CHUNK_SIZE, file_size.value - total_read)
+                if not _ReadFile(handle, ctypes.byref(buffer, total_read), to_read,
+                                 ctypes.byref(bytes_read), None):
+                    return None
+                if bytes_read.value == 0:
+                    break
+                total_read += bytes_read.value
 
-            if ReadFile(handle, buffer, file_size.value, ctypes.byref(bytes_read), None):
-                if is_binary:
-                    return buffer.raw[:bytes_read.value]
-                else:
-                    try:
-                        return buffer.raw[:bytes_read.value].decode('utf-8')
-                    except UnicodeDecodeError:
-                        # 编码失败，尝试其他编码
-                        for encoding in ['cp1252', 'utf-16', 'latin1']:
-                            try:
-                                return buffer.raw[:bytes_read.value].decode(encoding)
-                            except UnicodeDecodeError:
-                                continue
-                        # 所有编码都失败，作为二进制返回
-                        return buffer.raw[:bytes_read.value]
-            return None
+            with memoryview(buffer).cast('B')[:total_read] as data:
+                return decode_content(data)
 
         finally:
-            CloseHandle(handle)
+            _CloseHandle(handle)
 
     except Exception as e:
         return None
@@ -258,7 +353,7 @@ def windows_fast_file_write(file_path, content, is_binary=False, buffer_size=655
     """
     使用Windows原生API和大缓冲区快速写入文件
     """
-    if platform.system() != 'Windows':
+    if not IS_WINDOWS:
         return False
 
     try:
@@ -285,124 +380,87 @@ def gather_files_to_txt_windows_optimized(input_path, show_progress_callback=Non
     # 启用Windows优化
     optimize_for_windows()
 
+    # 只在入口处解析用户输入的路径；由它拼接出的输出路径和扫描得到的路径无需再次resolve
     input_path = get_safe_path(input_path)
 
     # 处理输入是文件的情况
     if os.path.isfile(input_path):
         folder_name = os.path.basename(input_path)
-        output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_file_{folder_name}.txt")))
-        files_to_process = [(os.path.basename(input_path), input_path)]
+        output_file = Path(os.path.join(os.path.dirname(input_path), f"combined_file_{folder_name}.txt"))
+        files_to_process = [(os.path.basename(input_path), input_path, False)]
     else:
         # 使用Windows原生API快速文件枚举
         files_to_process = windows_fast_file_enumeration(input_path)
 
         if files_to_process is None:
-            # 回退到标准方法
+            # 回退到标准方法，目录标志取自遍历时的stat结果
             print_colored("回退到标准文件扫描...", 'yellow')
-            folder_name = os.path.basename(os.path.normpath(input_path))
-            output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_files_{folder_name}.txt")))
-            base_path = os.path.normpath(input_path)
-            files_to_process = []
-
-            for root, dirs, files in os.walk(input_path):
-                for file in files:
-                    file_path = get_safe_path(os.path.join(root, file))
-                    relative_path = os.path.relpath(file_path, start=base_path).replace(os.sep, '/')
-                    files_to_process.append((relative_path, file_path))
-
-                for dir_name in dirs:
-                    dir_path = get_safe_path(os.path.join(root, dir_name))
-                    if not os.listdir(dir_path):
-                        relative_path = os.path.relpath(dir_path, start=base_path).replace(os.sep, '/')
-                        files_to_process.append((relative_path, dir_path))
-        else:
-            folder_name = os.path.basename(os.path.normpath(input_path))
-            output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_files_{folder_name}.txt")))
+            files_to_process = [(relative_path, file_path, stat.S_ISDIR(st.st_mode))
+                                for relative_path, file_path, st in _scan_tree(input_path, with_stat=True)]
+        folder_name = os.path.basename(os.path.normpath(input_path))
+        output_file = Path(os.path.join(os.path.dirname(input_path), f"combined_files_{folder_name}.txt"))
 
     # Windows优化：选择最佳的二进制检测和文件读取方法
     binary_check_func = is_binary_file_windows_optimized
 
-    # Windows优化：使用大缓冲区写入
-    buffer_size = 128 * 1024  # 128KB缓冲区
-
     print_colored(f"📝 开始处理 {len(files_to_process)} 个项目...", 'blue')
 
-    # 批处理优化：先分类文件，再批量处理
-    binary_files = []
-    text_files = []
-    directories = []
-
-    for relative_path, file_path in files_to_process:
-        if os.path.isdir(file_path):
-            directories.append((relative_path, file_path))
-        elif binary_check_func(file_path):
-            binary_files.append((relative_path, file_path))
-        else:
-            text_files.append((relative_path, file_path))
-
-    print_colored(f"📊 文件分类: {len(text_files)}个文本, {len(binary_files)}个二进制, {len(directories)}个目录", 'blue')
-
-    with open(output_file, 'w', encoding='utf-8', buffering=buffer_size) as out_f:
-        out_f.write("UNCOMPRESSED\n")
+    def prepare(item):
+        # 在工作线程中完成分类和读取，返回 (类型, 内容)；内容为None表示写入时再读取
+        _, file_path, is_dir = item
+        if is_dir:
+            return 'dir', None
+        if binary_check_func(file_path):
+            return 'binary', _read_small_file(file_path)
+        # 尝试Windows原生API读取
+        return 'text', windows_fast_file_read(file_path, is_binary=False)
+
+    # 分类、读取和写入合并为一次遍历：工作线程提前分类并读取，主线程按枚举顺序写入
+    kind_counts = {'dir': 0, 'binary': 0, 'text': 0}
+
+    # Windows优化：以二进制方式使用大缓冲区写入，小写入在缓冲区中合并；
+    # 不经过文本层的逐次编码和换行转换（文本模式会把内容中原有的\r\n写成\r\r\n）
+    with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as out_f:
+        out_f.write(b"UNCOMPRESSED\n")
         total_files = len(files_to_process)
         processed_count = 0
 
-        # 批处理1: 先处理目录
-        for relative_path, file_path in directories:
+        for (relative_path, file_path, _), future in _prefetch_ordered(prepare, files_to_process):
             try:
-                out_f.write(f"\n@{relative_path}\n[EMPTY_DIRECTORY]\n\n")
-                processed_count += 1
-                if show_progress_callback and processed_count % 10 == 0:
-                    show_progress_callback(processed_count, total_files)
-            except Exception as e:
-                out_f.write(f"\n!{relative_path}\n{str(e)}\n")
-
-        # 批处理2: 处理文本文件
-        for relative_path, file_path in text_files:
-            try:
-                out_f.write(f"\n@{relative_path}\n")
-
-                # 尝试Windows原生API读取
-                content = windows_fast_file_read(file_path, is_binary=False)
-                if content is None:
-                    # 回退到标准读取
-                    with open(file_path, 'r', encoding='utf-8') as in_f:
-                        content = in_f.read()
+                kind, data = future.result()
+                kind_counts[kind] += 1
+                header = f"\n@{relative_path}\n".encode('utf-8')
+
+                if kind == 'dir':
+                    out_f.write(header + b"[EMPTY_DIRECTORY]\n\n")
+                elif kind == 'binary':
+                    if data is not None:
+                        out_f.writelines((header, b"B\n", _b64.b64encode(data), b"\n\n"))
+                    else:
+                        # 大文件Base64分块读取编码并写入，不在内存中同时保留整个文件和它的编码结果
+                        out_f.write(header + b"B\n")
+                        for encoded in _iter_base64_chunks(file_path):
+                            out_f.write(encoded)
+                        out_f.write(b"\n\n")
+                else:
+                    if data is None:
+                        # 回退到标准读取，校验UTF-8后原样写入
+                        with open(file_path, 'rb') as in_f:
+                            data = in_f.read()
+                        if not data.isascii():
+                            data.decode('utf-8')
+                    elif isinstance(data, str):
+                        data = data.encode('utf-8')
+                    out_f.writelines((header, data, b"\n"))
 
-                out_f.write(content)
-                out_f.write("\n")
                 processed_count += 1
-
                 if show_progress_callback and processed_count % 5 == 0:
                     show_progress_callback(processed_count, total_files)
 
             except Exception as e:
-                out_f.write(f"\n!{relative_path}\n{str(e)}\n")
-
-        # 批处理3: 处理二进制文件
-        for relative_path, file_path in binary_files:
-            try:
-                out_f.write(f"\n@{relative_path}\nB\n")
-
-                # 尝试Windows原生API读取
-                content = windows_fast_file_read(file_path, is_binary=True)
-                if content is None:
-                    # 回退到标准读取
-                    with open(file_path, 'rb') as in_f:
-                        content = in_f.read()
-
-                # Base64编码
-                encoded_content = base64.b64encode(content).decode('ascii')
-                out_f.write(encoded_content)
-                out_f.write("\n\n")
-                processed_count += 1
-
-                if show_progress_callback and processed_count % 2 == 0:
-                    show_progress_callback(processed_count, total_files)
-
-            except Exception as e:
-                out_f.write(f"\n!{relative_path}\n{str(e)}\n")
+                out_f.write(f"\n!{relative_path}\n{str(e)}\n".encode('utf-8'))
 
+    print_colored(f"📊 文件分类: {kind_counts['text']}个文本, {kind_counts['binary']}个二进制, {kind_counts['dir']}个目录", 'blue')
     print_colored("✅ Windows优化处理完成！", 'green')
 
     # 进行快速完整性检查
@@ -413,46 +471,55 @@ def gather_files_to_txt_windows_optimized(input_path, show_progress_callback=Non
     return output_file
 
 
-def is_binary_file_windows_optimized(file_path):
+# Windows优化检测使用的扩展名集合（模块级常量，避免每次调用重新构建集合）
+# Windows特有二进制文件扩展名
+_WINDOWS_BINARY_EXTENSIONS = frozenset({
+    # Windows特有格式
+    '.exe', '.dll', '.msi', '.cab', '.sys', '.drv', '.ocx', '.cpl',
+    '.scr', '.com', '.lnk', '.pif', '.scf',
+    # 通用二进制格式（完整列表）
+    '.ttf', '.otf', '.woff', '.woff2', '.eot', '.pfb', '.pfm', '.afm',
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.tiff', '.tif', '.webp',
+    '.svg', '.psd', '.ai', '.eps', '.raw', '.cr2', '.nef', '.arw', '.dng',
+    '.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus',
+    '.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv', '.webm', '.mpg', '.mpeg',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt',
+    '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.lzma',
+    '.jar', '.war', '.class', '.dex', '.apk', '.pyc', '.pyo',
+    '.sqlite', '.db', '.mdb', '.accdb', '.dbf'
+})
+
+# Windows常见文本文件扩展名
+_WINDOWS_TEXT_EXTENSIONS = frozenset({
+    '.txt', '.log', '.ini', '.cfg', '.conf', '.xml', '.json', '.csv',
+    '.html', '.htm', '.css', '.js', '.ts', '.py', '.java', '.c', '.cpp',
+    '.h', '.hpp', '.cs', '.php', '.rb', '.go', '.rs', '.swift', '.kt',
+    '.md', '.rst', '.yaml', '.yml', '.sql', '.sh', '.bat', '.cmd', '.ps1'
+})
+
+
+def is_binary_file_windows_optimized(file_path, size=None, quick=False):
     """
     Windows优化版本的二进制文件检测
     优先使用扩展名判断，减少文件读取
+
+    :param size: 调用方已知的文件大小；为0时扩展名未知的文件直接视为文本，不打开文件
+    :param quick: 为True时只看扩展名，未知扩展名直接视为文本，完全不打开文件；
+                  只适合用于统计估算，写快照时必须检测内容，否则未知扩展名的二进制文件会被当作文本保存
     """
     try:
-        # 检查文件扩展名 - 某些扩展名明确表示二进制文件
-        _, ext = os.path.splitext(file_path.lower())
-
-        # Windows特有二进制文件扩展名
-        windows_binary_extensions = {
-            # Windows特有格式
-            '.exe', '.dll', '.msi', '.cab', '.sys', '.drv', '.ocx', '.cpl',
-            '.scr', '.com', '.lnk', '.pif', '.scf',
-            # 通用二进制格式（完整列表）
-            '.ttf', '.otf', '.woff', '.woff2', '.eot', '.pfb', '.pfm', '.afm',
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.tiff', '.tif', '.webp',
-            '.svg', '.psd', '.ai', '.eps', '.raw', '.cr2', '.nef', '.arw', '.dng',
-            '.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus',
-            '.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv', '.webm', '.mpg', '.mpeg',
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt',
-            '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.lzma',
-            '.jar', '.war', '.class', '.dex', '.apk', '.pyc', '.pyo',
-            '.sqlite', '.db', '.mdb', '.accdb', '.dbf'
-        }
-
-        # Windows常见文本文件扩展名
-        windows_text_extensions = {
-            '.txt', '.log', '.ini', '.cfg', '.conf', '.xml', '.json', '.csv',
-            '.html', '.htm', '.css', '.js', '.ts', '.py', '.java', '.c', '.cpp',
-            '.h', '.hpp', '.cs', '.php', '.rb', '.go', '.rs', '.swift', '.kt',
-            '.md', '.rst', '.yaml', '.yml', '.sql', '.sh', '.bat', '.cmd', '.ps1'
-        }
+        # 检查文件扩展名 - 某些扩展名明确表示二进制文件；只对扩展名转小写，不处理整个路径
+        ext = os.path.splitext(file_path)[1].lower()
 
-        if ext in windows_binary_extensions:
+        if ext in _WINDOWS_BINARY_EXTENSIONS:
             return True  # 明确的二进制文件
 
-        if ext in windows_text_extensions:
+        if ext in _WINDOWS_TEXT_EXTENSIONS:
             return False  # 明确的文本文件
 
+        if quick or size == 0:
+            return False  # 快速模式或空文件视为文本
+
         # 对于未知扩展名，使用简化的检测（减少I/O）
         try:
             # 只读取前256字节进行快速检测（减少I/O）
@@ -462,12 +529,20 @@ def is_binary_file_windows_optimized(file_path):
                     return False  # 空文件视为文本
 
                 # 快速二进制检测
-                null_count = chunk.count(0)
-                if null_count > 0:  # 包含空字节，很可能是二进制
+                if b'\x00' in chunk:  # 包含空字节，很可能是二进制
                     return True
 
-                # 检查是否大部分是可打印字符
-                printable_count = sum(1 for b in chunk if 32 <= b <= 126 or b in (9, 10, 13))
+                # 含非ASCII字节时先做一次UTF-8校验：合法的UTF-8（如中文文本）直接视为文本，
+                # 不再因可打印ASCII比例低被误判为二进制；final=False 允许块末尾被截断的多字节序列
+                if not chunk.isascii():
+                    try:
+                        codecs.utf_8_decode(chunk, 'strict', False)
+                        return False
+                    except UnicodeDecodeError:
+                        pass
+
+                # 检查是否大部分是可打印字符（translate在C层删除可打印字节，差值即为可打印字符数）
+                printable_count = len(chunk) - len(chunk.translate(None, _PRINTABLE_BYTES))
                 if printable_count < len(chunk) * 0.75:  # 少于75%可打印字符
                     return True
 
@@ -479,116 +554,391 @@ def is_binary_file_windows_optimized(file_path):
         return False
 
 
-def is_binary_file(file_path):
+# 字节级文本检测用的字节表：可打印ASCII加制表符/换行/回车，以及其余的控制字符
+_PRINTABLE_BYTES = bytes(range(32, 127)) + b'\t\n\r'
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in (9, 10, 13))
+
+
+# 明确表示二进制文件的扩展名（模块级常量，避免每次调用重新构建集合）
+_BINARY_EXTENSIONS = frozenset({
+    # 可执行文件和库
+    '.exe', '.dll', '.so', '.dylib', '.bin', '.dat', '.db', '.sqlite', '.msi', '.dmg',
+    '.deb', '.rpm', '.app', '.ipa', '.pkg', '.msu', '.cab',
+    # 图像文件
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.tiff', '.tif', '.webp',
+    '.svg', '.psd', '.ai', '.eps', '.raw', '.cr2', '.nef', '.arw', '.dng',
+    '.heic', '.heif', '.jfif', '.jpx', '.j2k', '.avif', '.jp2',
+    # 音频文件
+    '.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus',
+    '.aiff', '.au', '.ra', '.amr', '.ac3', '.dts', '.pcm',
+    # 视频文件
+    '.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv', '.webm', '.mpg', '.mpeg',
+    '.m4v', '.3gp', '.f4v', '.asf', '.rm', '.rmvb', '.vob', '.ts', '.mts',
+    # 字体文件 (重要: TTF等之前可能有问题)
+    '.ttf', '.otf', '.woff', '.woff2', '.eot', '.pfb', '.pfm', '.afm',
+    '.ttc', '.otc', '.fon', '.bdf', '.pcf',
+    # 文档文件
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt',
+    '.ods', '.odp', '.pages', '.numbers', '.key', '.rtf', '.epub', '.mobi',
+    # 压缩文件
+    '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.lzma', '.lz4',
+    '.zst', '.arj', '.lha', '.ace', '.iso', '.img', '.nrg', '.mds', '.cue',
+    # 编程相关二进制
+    '.jar', '.war', '.ear', '.class', '.dex', '.apk', '.aar', '.pyc', '.pyo',
+    '.wasm', '.o', '.obj', '.lib', '.a', '.pdb', '.ilk', '.exp',
+    # 设计和CAD文件
+    '.dwg', '.dxf', '.3ds', '.max', '.blend', '.fbx', '.dae',
+    '.skp', '.ifc', '.step', '.stp', '.iges', '.igs',
+    # 数据库和数据文件
+    '.mdb', '.accdb', '.dbf', '.sqlite3', '.db3', '.s3db', '.sl3',
+    # 游戏相关
+    '.unity3d', '.unitypackage', '.asset', '.prefab', '.mat', '.mesh',
+    # 其他二进制格式
+    '.swf', '.fla', '.psd', '.sketch', '.fig', '.xd', '.indd',
+    '.p12', '.pfx', '.jks', '.keystore', '.cer', '.crt', '.p7b'
+})
+
+# 明确表示文本文件的扩展名
+_TEXT_EXTENSIONS = frozenset({
+    '.txt', '.py', '.js', '.html', '.css', '.json', '.xml', '.yaml', '.yml',
+    '.md', '.rst', '.csv', '.sql', '.sh', '.bat', '.ps1', '.java', '.c',
+    '.cpp', '.h', '.hpp', '.cs', '.php', '.rb', '.go', '.rs', '.swift',
+    '.kt', '.scala', '.clj', '.hs', '.ml', '.fs', '.vb', '.pl', '.r',
+    '.m', '.mm', '.tsx', '.jsx', '.vue', '.svelte', '.ts', '.coffee',
+    '.sass', '.scss', '.less', '.styl', '.ini', '.cfg', '.conf', '.log',
+    '.properties', '.gitignore', '.dockerignore', '.editorconfig'
+})
+
+
+def _binary_by_extension(file_path):
+    """
+    仅根据扩展名判断文件类型，不做任何I/O
+    返回 True（二进制）、False（文本）或 None（扩展名未知，需要检测内容）
+    """
+    # 只对扩展名转小写，不处理整个路径
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in _BINARY_EXTENSIONS:
+        return True  # 明确的二进制文件扩展名
+    if ext in _TEXT_EXTENSIONS:
+        return False  # 明确的文本文件扩展名
+    return None
+
+
+def _sniff_binary(file_path, max_probe=8192):
+    """读取文件开头 max_probe 字节，根据内容判断是否为二进制文件"""
+    # 只打开一次文件，读取开头的一块，所有判断都在这一块字节上完成
+    with open(file_path, 'rb') as f:
+        chunk = f.read(max_probe)
+    if len(chunk) == 0:
+        return False  # 空文件视为文本文件
+
+    # 包含空字节，很可能是二进制（UTF-16文本也按二进制保存，保证原样恢复）
+    if b'\x00' in chunk:
+        return True
+
+    # 合法的UTF-8视为文本；final=False 允许块末尾被截断的多字节序列
+    if chunk.isascii():
+        return False
+    try:
+        codecs.utf_8_decode(chunk, 'strict', False)
+        return False
+    except UnicodeDecodeError:
+        pass  # 不是UTF-8，继续字节级检测
+
+    # 字节级启发式检测：translate在C层删除指定字节，剩余长度即为其余字节的数量
+    # 检查是否包含大量非可打印字符
+    non_printable_count = len(chunk.translate(None, _PRINTABLE_BYTES))
+    if non_printable_count > len(chunk) * 0.3:  # 如果少于70%是可打印字符
+        return True
+
+    # 检查是否包含连续的控制字符
+    control_chars = len(chunk) - len(chunk.translate(None, _CONTROL_BYTES))
+    if control_chars > len(chunk) * 0.1:  # 如果超过10%是控制字符
+        return True
+
+    return False  # 默认视为文本文件（如Latin-1等单字节编码的文本）
+
+
+def is_binary_file(file_path, size=None):
     """
     判断文件是否为二进制文件 - 改进的跨平台检测
+
+    :param size: 调用方已知的文件大小（如遍历时的stat结果）；为0时扩展名未知的文件直接视为文本，不打开文件
     """
     try:
-        # 检查文件扩展名 - 某些扩展名明确表示二进制文件
-        _, ext = os.path.splitext(file_path.lower())
-        binary_extensions = {
-            # 可执行文件和库
-            '.exe', '.dll', '.so', '.dylib', '.bin', '.dat', '.db', '.sqlite', '.msi', '.dmg',
-            '.deb', '.rpm', '.app', '.ipa', '.pkg', '.msu', '.cab',
-            # 图像文件
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.tiff', '.tif', '.webp',
-            '.svg', '.psd', '.ai', '.eps', '.raw', '.cr2', '.nef', '.arw', '.dng',
-            '.heic', '.heif', '.jfif', '.jpx', '.j2k', '.avif', '.jp2',
-            # 音频文件
-            '.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus',
-            '.aiff', '.au', '.ra', '.amr', '.ac3', '.dts', '.pcm',
-            # 视频文件
-            '.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv', '.webm', '.mpg', '.mpeg',
-            '.m4v', '.3gp', '.f4v', '.asf', '.rm', '.rmvb', '.vob', '.ts', '.mts',
-            # 字体文件 (重要: TTF等之前可能有问题)
-            '.ttf', '.otf', '.woff', '.woff2', '.eot', '.pfb', '.pfm', '.afm',
-            '.ttc', '.otc', '.fon', '.bdf', '.pcf',
-            # 文档文件
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt',
-            '.ods', '.odp', '.pages', '.numbers', '.key', '.rtf', '.epub', '.mobi',
-            # 压缩文件
-            '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz', '.lzma', '.lz4',
-            '.zst', '.arj', '.lha', '.ace', '.iso', '.img', '.nrg', '.mds', '.cue',
-            # 编程相关二进制
-            '.jar', '.war', '.ear', '.class', '.dex', '.apk', '.aar', '.pyc', '.pyo',
-            '.wasm', '.o', '.obj', '.lib', '.a', '.pdb', '.ilk', '.exp',
-            # 设计和CAD文件
-            '.dwg', '.dxf', '.3ds', '.max', '.blend', '.fbx', '.obj', '.dae',
-            '.skp', '.ifc', '.step', '.stp', '.iges', '.igs',
-            # 数据库和数据文件
-            '.mdb', '.accdb', '.dbf', '.sqlite3', '.db3', '.s3db', '.sl3',
-            # 游戏相关
-            '.unity3d', '.unitypackage', '.asset', '.prefab', '.mat', '.mesh',
-            # 其他二进制格式
-            '.swf', '.fla', '.psd', '.sketch', '.fig', '.xd', '.indd',
-            '.p12', '.pfx', '.jks', '.keystore', '.cer', '.crt', '.p7b'
-        }
-        
-        if ext in binary_extensions:
-            return True  # 明确的二进制文件扩展名
-        
-        # 检查文件扩展名 - 某些扩展名明确表示文本文件
-        text_extensions = {
-            '.txt', '.py', '.js', '.html', '.css', '.json', '.xml', '.yaml', '.yml',
-            '.md', '.rst', '.csv', '.sql', '.sh', '.bat', '.ps1', '.java', '.c', 
-            '.cpp', '.h', '.hpp', '.cs', '.php', '.rb', '.go', '.rs', '.swift',
-            '.kt', '.scala', '.clj', '.hs', '.ml', '.fs', '.vb', '.pl', '.r',
-            '.m', '.mm', '.tsx', '.jsx', '.vue', '.svelte', '.ts', '.coffee',
-            '.sass', '.scss', '.less', '.styl', '.ini', '.cfg', '.conf', '.log',
-            '.properties', '.gitignore', '.dockerignore', '.editorconfig'
-        }
-        
-        if ext in text_extensions:
-            return False  # 明确的文本文件扩展名
-        
-        # 首先尝试以文本方式读取文件
-        # 这是最可靠的方法来判断文件是否为文本
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                f.read(1024)  # 尝试读取前1024个字符
-            return False  # 如果成功读取，则为文本文件
-        except UnicodeDecodeError:
-            pass  # UTF-8解码失败，继续其他检测
-        
-        # 尝试其他常见编码
-        common_encodings = ['utf-16', 'utf-16-le', 'utf-16-be', 'latin1', 'cp1252']
-        for encoding in common_encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read(1024)
-                    # 检查内容是否看起来像文本
-                    if content and content.isprintable() or '\n' in content or '\t' in content:
-                        return False  # 成功解码且看起来像文本
-            except (UnicodeDecodeError, UnicodeError):
-                continue
-        
-        # 如果所有编码都失败，进行字节级检测
-        with open(file_path, 'rb') as f:
-            chunk = f.read(1024)
-            if len(chunk) == 0:
-                return False  # 空文件视为文本文件
-            
-            # 字节级启发式检测
-            null_count = chunk.count(0)
-            if null_count > 0:  # 如果包含空字节，很可能是二进制
-                return True
-            
-            # 检查是否包含大量非可打印字符
-            printable_count = sum(1 for b in chunk if 32 <= b <= 126 or b in (9, 10, 13))
-            if len(chunk) > 0 and printable_count < len(chunk) * 0.7:  # 如果少于70%是可打印字符
-                return True
-            
-            # 检查是否包含连续的控制字符
-            control_chars = sum(1 for b in chunk if b < 32 and b not in (9, 10, 13))
-            if control_chars > len(chunk) * 0.1:  # 如果超过10%是控制字符
-                return True
-            
-            return False  # 默认视为文本文件
-            
+        # 检查文件扩展名 - 某些扩展名明确表示二进制或文本文件
+        by_extension = _binary_by_extension(file_path)
+        if by_extension is not None:
+            return by_extension
+
+        if size == 0:
+            return False  # 空文件视为文本文件
+
+        return _sniff_binary(file_path)
+
     except Exception:
         return False  # 出错时默认为文本文件
 
 
+def _list_directory(path):
+    """列出目录下的所有条目，无法打开时返回None"""
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError:
+        return None
+
+
+def _scan_tree(input_path, deterministic=False, with_stat=False, max_workers=None):
+    """
+    使用os.scandir深度优先遍历目录，返回 (相对路径, 完整路径) 列表，包含所有文件和空目录
+    DirEntry自带类型缓存，entry.path为直接拼接的字符串，避免逐项构造Path对象和额外的stat调用
+    与os.walk行为一致：不进入指向目录的符号链接，仅在其为空时作为空目录记录
+    目录按层交给线程池并行列出，多个目录的读取延迟相互重叠（机械硬盘、网络文件系统上收益明显），
+    结果仍按串行深度优先遍历的顺序组装
+
+    :param deterministic: 为True时每个目录内按名称排序，输出顺序稳定
+    :param with_stat: 为True时返回 (相对路径, 完整路径, stat结果)，大小和修改时间来自同一次stat，
+                      Windows下直接使用目录枚举时缓存的信息
+    :param max_workers: 并行列目录的线程数，默认与 _prefetch_ordered 相同
+    """
+    base_path = os.path.normpath(input_path)
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    # 第一阶段：逐层并行列出所有需要递归的目录
+    listings = {}
+    level = [base_path]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            next_level = []
+            for path, entries in zip(level, executor.map(_list_directory, level)):
+                listings[path] = entries
+                for entry in entries or ():
+                    try:
+                        if entry.is_dir() and not entry.is_symlink():
+                            next_level.append(entry.path)
+                    except OSError:
+                        pass
+            level = next_level
+
+    # 第二阶段：按目录内顺序深度优先组装结果，不再访问文件系统（符号链接目录和stat除外）
+    files_to_process = []
+    stack = [(base_path, None)]
+    # entry.path 由父目录路径直接拼接而来，以 base_path 为前缀，相对路径直接切片得到，无需逐项调用relpath
+    base_len = len(base_path) if base_path.endswith(os.sep) else len(base_path) + 1
+    convert_sep = os.sep != '/'
+
+    def add(path, entry):
+        relative_path = path[base_len:]
+        if convert_sep:
+            relative_path = relative_path.replace(os.sep, '/')
+        if not with_stat:
+            files_to_process.append((relative_path, path))
+            return
+        try:
+            st = entry.stat()
+        except OSError:
+            st = entry.stat(follow_symlinks=False)  # 失效的符号链接
+        files_to_process.append((relative_path, path, st))
+
+    while stack:
+        current, current_entry = stack.pop()
+        entries = listings.get(current)
+        if entries is None:
+            continue
+
+        if not entries:
+            if current_entry is not None:
+                add(current, current_entry)
+            continue
+
+        if deterministic:
+            entries.sort(key=lambda e: e.name)
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if not is_dir:
+                add(entry.path, entry)
+            elif entry.is_symlink():
+                # 符号链接目录不递归，只检查是否为空：取到第一个条目即可，不列出整个目录
+                try:
+                    with os.scandir(entry.path) as it:
+                        is_empty = next(it, None) is None
+                except OSError:
+                    is_empty = False
+                if is_empty:
+                    add(entry.path, entry)
+            else:
+                subdirs.append((entry.path, entry))
+
+        # 逆序入栈，保证按目录内顺序处理子目录
+        stack.extend(reversed(subdirs))
+
+    return files_to_process
+
+
+def _classify_and_stream(file_path, chunk_size=1 << 20):
+    """
+    以二进制分块读取文件并增量校验UTF-8
+    校验通过的块原样产出，不构造整个文件大小的str；遇到非法UTF-8时抛出UnicodeDecodeError
+    纯ASCII的块用 bytes.isascii() 判断即可，无需解码
+    块末尾未完整的多字节序列留到下一块再产出，已产出的字节始终是完整合法的UTF-8，
+    出错时已产出的总字节数就是剩余内容在文件中的起始位置
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='strict')
+    held = b''
+    with open(file_path, 'rb') as in_f:
+        while True:
+            chunk = in_f.read(chunk_size)
+            if not chunk:
+                decoder.decode(b'', final=True)  # 检查文件末尾是否有截断的多字节序列
+                return
+            # 没有留下的多字节序列时，ASCII块一定合法
+            if not chunk.isascii() or held:
+                decoder.decode(chunk)
+                pending = decoder.getstate()[0]
+                if held:
+                    chunk = held + chunk
+                if pending:
+                    chunk = chunk[:-len(pending)]
+                held = pending
+                if not chunk:
+                    continue
+            yield chunk
+
+
+def _iter_base64_chunks(file_path, chunk_size=3 << 20):
+    """
+    分块读取文件并逐块base64编码，块大小为3的倍数，各块编码结果直接拼接即为整个文件的编码
+    读取使用同一个预分配缓冲区（readinto），峰值内存与块大小相关，而不是与文件大小相关
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as in_f:
+        while True:
+            # BufferedReader.readinto 会读满缓冲区直到文件末尾，只有最后一块可能不足
+            n = in_f.readinto(buffer)
+            if not n:
+                return
+            yield _b64.b64encode(view[:n])
+
+
+def _decode_base64_to_file(encoded, out_f, chunk_size=4 << 20):
+    """
+    分块解码base64内容并写入已打开的二进制文件，避免一次生成整个解码结果
+    encoded 可以是str或bytes，块大小为4的倍数
+    """
+    encoded = encoded.strip()
+    if '\n' in encoded if isinstance(encoded, str) else b'\n' in encoded:
+        # 兼容带换行的base64内容，去掉所有空白后按4字符对齐
+        encoded = encoded[:0].join(encoded.split())
+    for start in range(0, len(encoded), chunk_size):
+        out_f.write(_b64.b64decode(encoded[start:start + chunk_size]))
+
+
+def _write_bytes_to_path(path, data):
+    """
+    用os.open/os.write把bytes类数据整体写入文件（覆盖已有内容）
+    不创建Python文件对象和缓冲区，内容已完整在内存中时只需open/write/close三次系统调用
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with memoryview(data) as view:
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _ensure_directory(path, ensured):
+    """
+    确保目录存在，ensured为已确认存在的目录集合
+    同一父目录下的大量文件只调用一次os.makedirs；创建后把各级上层目录一并记入集合，子目录创建时不再重复stat父目录
+    """
+    if not path or path in ensured:
+        return
+    os.makedirs(path, exist_ok=True)
+    while path and path not in ensured:
+        ensured.add(path)
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+
+def _prefetch_ordered(func, items, max_workers=None, max_pending=64):
+    """
+    使用线程池提前执行 func(item)，按items的原有顺序产出 (item, future)
+    文件读取会释放GIL，多个线程可以同时等待I/O；在途任务最多max_pending个，限制预读占用的内存
+    """
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in itertools.islice(items, max_pending):
+            pending.append((item, executor.submit(func, item)))
+        while pending:
+            item, future = pending.popleft()
+            for next_item in itertools.islice(items, 1):
+                pending.append((next_item, executor.submit(func, next_item)))
+            yield item, future
+
+
+def _has_duplicate_paths(paths):
+    """
+    判断恢复路径中是否有指向同一文件的重复项，有重复时恢复需要串行进行，保证后出现的条目覆盖先出现的
+    Windows和macOS的文件系统通常不区分大小写（README.md与readme.md是同一个文件），因此统一按忽略大小写比较
+    """
+    keys = [os.path.normcase(path).casefold() for path in paths]
+    return len(set(keys)) != len(keys)
+
+
+def _prefetch_entry(file_path, binary_check_func):
+    """
+    在工作线程中判断条目类型，小文件同时读入内容
+    返回 (类型, 内容)，类型为 'dir'、'binary' 或 'text'，内容为None表示需要写入时再读取
+    """
+    # 一次stat同时得到类型和大小；空文件无需打开即可判断并得到内容
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        st = None  # 失效的符号链接等，留给写入阶段处理并记录错误
+    if st is not None and stat.S_ISDIR(st.st_mode):
+        return 'dir', None
+    size = st.st_size if st is not None else None
+    kind = 'binary' if binary_check_func(file_path, size) else 'text'
+    if size == 0:
+        return kind, b''
+    data = None
+    try:
+        if size is not None and size <= PREFETCH_MAX_FILE_SIZE:
+            with open(file_path, 'rb') as in_f:
+                data = in_f.read()
+    except OSError:
+        pass  # 读取失败时留给写入阶段处理并记录错误
+    return kind, data
+
+
+def _read_small_file(file_path):
+    """文件不超过 PREFETCH_MAX_FILE_SIZE 时读入全部内容；文件较大或读取失败时返回None，由调用方分块处理"""
+    try:
+        if os.path.getsize(file_path) <= PREFETCH_MAX_FILE_SIZE:
+            with open(file_path, 'rb') as in_f:
+                return in_f.read()
+    except OSError:
+        pass
+    return None
+
+
 def gather_files_to_txt(input_path, show_progress_callback=None):
     """
     将文件夹或单个文件内容合并到一个txt文件中
@@ -596,6 +946,7 @@ def gather_files_to_txt(input_path, show_progress_callback=None):
     :param input_path: 要处理的文件夹路径或文件路径(可以是文件列表)
     :return: 输出文件的Path对象
     """
+    # 只在入口处解析用户输入的路径；由它拼接出的输出路径和扫描得到的路径无需再次resolve
     input_path = get_safe_path(input_path)
     
     # 处理输入是文件的情况
@@ -604,9 +955,14 @@ def gather_files_to_txt(input_path, show_progress_callback=None):
         is_file_list = False
         try:
             with open(input_path, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
+                # 只读取到第一个非空行，不把整个输入文件逐行读入内存
+                first_line = ''
+                for line in iter(lambda: f.readline(4096), ''):
+                    first_line = line.strip()
+                    if first_line:
+                        break
                 # 简单判断是否为文件列表：第一行是否为有效文件路径
-                if lines and os.path.exists(lines[0]):
+                if first_line and os.path.exists(first_line):
                     is_file_list = True
         except:
             pass
@@ -618,7 +974,7 @@ def gather_files_to_txt(input_path, show_progress_callback=None):
             
             # 确定输出文件路径
             base_name = os.path.basename(input_path)
-            output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_from_list_{base_name}.txt")))
+            output_file = Path(os.path.join(os.path.dirname(input_path), f"combined_from_list_{base_name}.txt"))
             
             files_to_process = []
             for file_path in file_list:
@@ -628,91 +984,98 @@ def gather_files_to_txt(input_path, show_progress_callback=None):
         else:
             # 单个文件
             base_name = os.path.basename(input_path)
-            output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_file_{base_name}.txt")))
+            output_file = Path(os.path.join(os.path.dirname(input_path), f"combined_file_{base_name}.txt"))
             files_to_process = [(base_name, input_path)]
     else:
         # 处理文件夹的情况
         folder_name = os.path.basename(os.path.normpath(input_path))
-        output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"combined_files_{folder_name}.txt")))
-        base_path = os.path.normpath(input_path)
-        files_to_process = []
-        
+        output_file = Path(os.path.join(os.path.dirname(input_path), f"combined_files_{folder_name}.txt"))
+
         # 收集所有文件和空目录
-        for root, dirs, files in os.walk(input_path):
-            # 添加文件
-            for file in files:
-                file_path = get_safe_path(os.path.join(root, file))
-                relative_path = os.path.relpath(file_path, start=base_path).replace(os.sep, '/')
-                files_to_process.append((relative_path, file_path))
-            
-            # 添加空目录
-            for dir_name in dirs:
-                dir_path = get_safe_path(os.path.join(root, dir_name))
-                # 检查是否为空目录
-                if not os.listdir(dir_path):
-                    relative_path = os.path.relpath(dir_path, start=base_path).replace(os.sep, '/')
-                    files_to_process.append((relative_path, dir_path))
+        files_to_process = _scan_tree(input_path)
     
     # Windows优化：选择合适的二进制检测函数
-    if platform.system() == 'Windows':
+    if IS_WINDOWS:
         binary_check_func = is_binary_file_windows_optimized
         # 显示Windows优化提示
         optimize_for_windows()
     else:
         binary_check_func = is_binary_file
 
-    # 写入文件内容，使用更紧凑的格式
-    buffer_size = 64 * 1024 if platform.system() == 'Windows' else 8 * 1024
-
-    with open(output_file, 'w', encoding='utf-8', buffering=buffer_size) as out_f:
-        out_f.write("UNCOMPRESSED\n")  # 简化格式标识符
+    # 以二进制方式写入：文本文件按块原样透传，无需先解码成str再重新编码
+    # 使用大缓冲区，每个条目的多次小写入合并后再落盘
+    with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as out_f:
+        out_f.write(b"UNCOMPRESSED\n")  # 简化格式标识符
         total_files = len(files_to_process)
         processed_count = 0
 
-        for relative_path, file_path in files_to_process:
+        # 类型判断和小文件读取交给线程池提前完成，写入仍按原顺序在当前线程进行
+        prefetched = _prefetch_ordered(lambda item: _prefetch_entry(item[1], binary_check_func), files_to_process)
+        for (relative_path, file_path), future in prefetched:
             try:
-                out_f.write(f"\n@{relative_path}\n")  # 简化标记
+                kind, data = future.result()
+                header = f"\n@{relative_path}\n".encode('utf-8')  # 简化标记
                 # 检查是否为目录
-                if os.path.isdir(file_path):
-                    out_f.write("[EMPTY_DIRECTORY]\n")
+                if kind == 'dir':
+                    out_f.write(header + b"[EMPTY_DIRECTORY]\n\n")
                 # 检查是否为二进制文件
-                elif binary_check_func(file_path):
-                    # 二进制文件使用base64编码
-                    with open(file_path, 'rb') as in_f:
-                        content = base64.b64encode(in_f.read()).decode('ascii')
-                        out_f.write(f"B\n{content}\n")  # 简化二进制标记
+                elif kind == 'binary':
+                    # 二进制文件使用base64编码，小文件的条目各部分一次批量写入，大文件分块编码写入
+                    if data is not None:
+                        out_f.writelines((header, b"B\n", _b64.b64encode(data), b"\n\n"))  # 简化二进制标记
+                    else:
+                        out_f.write(header + b"B\n")
+                        for encoded in _iter_base64_chunks(file_path):
+                            out_f.write(encoded)
+                        out_f.write(b"\n\n")
                 else:
-                    # 文本文件直接读取 - Windows编码优化
+                    # 文本文件校验UTF-8后原样写入，大文件分块读取并校验
+                    out_f.write(header)
+                    content_start = out_f.tell()
                     try:
-                        with open(file_path, 'r', encoding='utf-8') as in_f:
-                            content = in_f.read()
+                        if data is not None:
+                            if not data.isascii():
+                                data.decode('utf-8')  # 仅用于校验，ASCII内容无需解码
+                            out_f.write(data)
+                        else:
+                            for chunk in _classify_and_stream(file_path):
+                                out_f.write(chunk)
                     except UnicodeDecodeError:
+                        # 不是合法的UTF-8，丢弃已写入的部分后走编码回退
+                        out_f.seek(content_start)
+                        out_f.truncate()
+
                         # Windows常见编码回退策略
-                        encodings = ['cp1252', 'utf-16', 'latin1'] if platform.system() == 'Windows' else ['latin1']
+                        # 与压缩快照一致保留原有换行符：已读入的内容直接解码，大文件以newline=''读取，不做换行转换
+                        encodings = ['cp1252', 'utf-16', 'latin1'] if IS_WINDOWS else ['latin1']
                         content = ""
                         for encoding in encodings:
                             try:
-                                with open(file_path, 'r', encoding=encoding) as in_f:
-                                    content = in_f.read()
+                                if data is not None:
+                                    content = data.decode(encoding)
+                                else:
+                                    with open(file_path, 'r', encoding=encoding, newline='') as in_f:
+                                        content = in_f.read()
                                 break
                             except UnicodeDecodeError:
                                 continue
                         else:
                             # 所有编码都失败，作为二进制文件处理
-                            with open(file_path, 'rb') as in_f:
-                                content = base64.b64encode(in_f.read()).decode('ascii')
-                                out_f.write(f"B\n{content}\n")
-                                processed_count += 1
-                                if show_progress_callback:
-                                    show_progress_callback(processed_count, total_files)
-                                continue
-
-                    out_f.write(content)
-                out_f.write("\n")
+                            out_f.write(b"B\n")
+                            for encoded in _iter_base64_chunks(file_path):
+                                out_f.write(encoded)
+                            out_f.write(b"\n")
+                            processed_count += 1
+                            if show_progress_callback:
+                                show_progress_callback(processed_count, total_files)
+                            continue
+
+                        out_f.write(content.encode('utf-8'))
+                    out_f.write(b"\n")
 
                 processed_count += 1
             except Exception as e:
-                out_f.write(f"\n!{relative_path}\n{str(e)}\n")  # 简化错误标记
+                out_f.write(f"\n!{relative_path}\n{str(e)}\n".encode('utf-8'))  # 简化错误标记
 
             if show_progress_callback:
                 show_progress_callback(processed_count, total_files)
@@ -725,32 +1088,68 @@ def gather_files_to_txt(input_path, show_progress_callback=None):
     return output_file
 
 
-def compress_text_advanced(text):
-    """高级压缩文本内容，进一步减小文件大小"""
-    import zlib
-    import bz2
+def _compress_best_of(data, algorithms, probe_size=64 * 1024):
+    """
+    在数据开头probe_size字节上试压各算法，只用胜出的算法压缩完整数据
+    代替对完整数据逐个压缩再取最小，额外开销与数据大小无关
+    返回 (方法, 压缩结果)，全部失败时返回None
+    """
+    probe = data[:probe_size]
 
-    # 预处理：优化内容结构以提高压缩率
-    processed_text = preprocess_for_compression(text)
+    def try_compress(compress_func):
+        try:
+            return compress_func(probe), None
+        except Exception as e:
+            return None, e
 
-    original_bytes = processed_text.encode('utf-8')
-    original_size = len(original_bytes)
+    # 大输入时各算法在线程池中同时试压（zlib/lzma/bz2压缩时都会释放GIL），小输入不值得线程池的开销
+    if len(data) > 1_000_000 and len(algorithms) > 1:
+        with ThreadPoolExecutor(max_workers=len(algorithms)) as executor:
+            outcomes = list(executor.map(try_compress, [func for _, func in algorithms]))
+    else:
+        outcomes = [try_compress(func) for _, func in algorithms]
+
+    results = []
+    for (method, compress_func), (compressed, error) in zip(algorithms, outcomes):
+        if error is not None:
+            print_colored(f"  {method}失败: {error}", 'yellow')
+        else:
+            results.append((method, compress_func, compressed))
+            print_colored(f"  {method}: {len(compressed)} 字节" +
+                          ("" if len(data) <= probe_size else " (试压前64KB)"), 'blue')
+
+    # 按试压结果从小到大尝试，胜出的算法在完整数据上失败时换下一个
+    for method, compress_func, compressed in sorted(results, key=lambda x: len(x[2])):
+        if len(data) <= probe_size:
+            return method, compressed
+        try:
+            return method, compress_func(data)
+        except Exception as e:
+            print_colored(f"  {method}失败: {e}", 'yellow')
+    return None
+
+
+def compress_text_advanced(text):
+    """高级压缩文本内容，进一步减小文件大小"""
+    # 与 compress_text 相同，保持所有原始内容：去掉行尾空白会丢失CRLF换行和文件末尾的换行，恢复结果与原文件不一致
+    processed_text = text
 
     # Windows优化：对于小文件使用更快的压缩
-    size_threshold = 4096 if platform.system() == 'Windows' else 2048
+    size_threshold = 4096 if IS_WINDOWS else 2048
+
+    # UTF-8字节数不少于字符数：字符数达到阈值时必然走大文件路径，不必为判断大小编码整个文本
+    original_bytes = processed_text.encode('utf-8') if len(processed_text) < size_threshold else None
 
-    if original_size < size_threshold:
+    if original_bytes is not None and len(original_bytes) < size_threshold:
         print_colored("使用高级快速压缩模式...", 'blue')
         try:
             # 使用ZLIB + 字典压缩
-            if platform.system() == 'Windows':
+            if IS_WINDOWS:
                 compressed = zlib.compress(original_bytes, level=6)
-                encoded = base64.b85encode(compressed).decode('ascii')
-                return f"ZLIB:{encoded}"
+                return _encode_compressed_payload('ZLIB', compressed)
             else:
                 compressed = lzma.compress(original_bytes, preset=6)
-                encoded = base64.b85encode(compressed).decode('ascii')
-                return encoded
+                return _encode_compressed_payload('LZMA', compressed)
         except:
             return processed_text
 
@@ -761,269 +1160,484 @@ def compress_text_advanced(text):
     reorganized_text = reorganize_content_for_compression(processed_text)
     reorganized_bytes = reorganized_text.encode('utf-8')
 
-    # 阶段2: 尝试多种高级压缩算法
-    results = []
-
+    # 阶段2: 在数据开头试压多种高级压缩算法，只用胜出者压缩完整数据
+    # LZMA使用preset=6：PRESET_EXTREME耗时约翻倍，压缩率提升通常不到1%
     # 算法优先级（Windows优化）
-    if platform.system() == 'Windows':
+    if IS_WINDOWS:
         algorithms = [
             ('ZLIB_ULTRA', lambda data: compress_with_dictionary(data, 'zlib')),
-            ('LZMA_EXTREME', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=9 | lzma.PRESET_EXTREME)),
+            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=6)),
             ('BZ2_MAX', lambda data: bz2.compress(data, compresslevel=9))
         ]
     else:
         algorithms = [
-            ('LZMA_EXTREME', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=9 | lzma.PRESET_EXTREME)),
+            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=6)),
             ('ZLIB_ULTRA', lambda data: compress_with_dictionary(data, 'zlib')),
             ('BZ2_MAX', lambda data: bz2.compress(data, compresslevel=9))
         ]
 
-    for method, compress_func in algorithms:
-        try:
-            compressed = compress_func(reorganized_bytes)
-            encoded = base64.b85encode(compressed).decode('ascii')
-            results.append((method, encoded, len(encoded)))
-            print_colored(f"  {method}: {len(encoded)} 字符", 'blue')
-        except Exception as e:
-            print_colored(f"  {method}失败: {e}", 'yellow')
-
-    if not results:
+    best = _compress_best_of(reorganized_bytes, algorithms)
+    if best is None:
         print_colored("警告: 所有高级压缩算法都失败，使用标准压缩", 'yellow')
         return compress_text(text)  # 回退到标准压缩
 
-    # 选择最佳结果
-    best_method, best_compressed, best_size = min(results, key=lambda x: x[2])
+    # 只对胜出的结果做一次base64编码
+    best_method, best_compressed = best
+    best_result = _encode_compressed_payload(best_method, best_compressed)
+    best_size = len(best_result)
 
     # 如果高级压缩效果不明显，回退到标准压缩
     standard_result = compress_text(text)
-    if len(best_compressed) > len(standard_result) * 0.95:  # 如果只提升不到5%
+    if best_size > len(standard_result) * 0.95:  # 如果只提升不到5%
         print_colored("高级压缩效果有限，使用标准压缩", 'blue')
         return standard_result
 
     print_colored(f"选择最佳高级算法: {best_method} (压缩后 {best_size} 字符)", 'green')
-    return f"{best_method}:{best_compressed}"
+    return best_result
 
 
-def preprocess_for_compression(text):
-    """预处理文本以提高压缩率"""
-    lines = text.split('\n')
-    processed_lines = []
+def reorganize_content_for_compression(text):
+    """
+    重组内容以提高压缩率
+    单次扫描：用find在以@和!开头的行之间跳转，记录每个section的切片位置，不把整个文本切分成行列表
+    """
+    find = text.find  # 循环内频繁调用，绑定为局部变量
+    size = len(text)
+
+    def next_entry_at(pos):
+        # 查找下一个文件标记行；与恢复时的条目扫描一致，跳过CSS的@规则、装饰器等以@开头的普通内容行
+        while True:
+            pos = find('\n@', pos)
+            if pos == -1:
+                return -1
+            line_end = find('\n', pos + 1)
+            line = text[pos + 1:line_end if line_end != -1 else size]
+            if len(line) > 1 and not _NON_ENTRY_AT_LINE_STR.match(line):
+                return pos
+            pos += 1
+
+    # 分类收集内容（每个section以原文切片加结尾换行的形式保存）
+    text_sections = []
+    binary_sections = []
+    directory_sections = []
 
-    # 优化1: 合并连续的空行
-    prev_empty = False
-    for line in lines:
-        if line.strip() == '':
-            if not prev_empty:
-                processed_lines.append('')
-            prev_empty = True
-        else:
-            processed_lines.append(line)
-            prev_empty = False
+    if text.startswith('@'):
+        start = 0
+    else:
+        start = next_entry_at(0)
+        if start != -1:
+            start += 1
+    next_bang = 0
+    while start != -1:
+        header_end = find('\n', start)
+        if header_end == -1:
+            break  # 最后一行是@行，没有内容
+
+        # section内容到下一个以@或!开头的行为止；!的位置只在越过后才重新查找，避免反复扫描到文本末尾
+        next_at = next_entry_at(header_end)
+        if next_bang != -1 and next_bang < header_end:
+            next_bang = find('\n!', header_end)
+        candidates = [pos for pos in (next_at, next_bang) if pos != -1]
+        body_end = min(candidates) if candidates else size
+
+        # 路径为空或没有内容行的section直接丢弃
+        if body_end > header_end and header_end > start + 1:
+            body_start = header_end + 1
+            if text.startswith('B\n', body_start, body_end):
+                # 二进制文件
+                sections = binary_sections
+            elif text.startswith('[EMPTY_DIRECTORY]', body_start, body_end):
+                # 空目录：标记就是内容的第一行，只比较开头，不在每个文本文件的全部内容里查找
+                sections = directory_sections
+            else:
+                # 文本文件
+                sections = text_sections
+            sections.append(text[start:body_end])
+            sections.append('\n')
 
-    # 优化2: 移除行尾空格（但保持文件内容完整性）
-    processed_lines = [line.rstrip() for line in processed_lines]
+        # !开头的错误标记及其内容不属于任何section，直接跳到下一个@行
+        start = next_at + 1 if next_at != -1 else -1
 
-    return '\n'.join(processed_lines)
+    # 重新组织：目录 -> 文本文件 -> 二进制文件
+    # 每个section后都追加了与下一个条目之间的分隔换行；最后一个section后面没有条目，去掉它，否则恢复时文件末尾多出一个换行
+    sections = directory_sections + text_sections + binary_sections
+    if sections:
+        sections.pop()
+    return ''.join(sections)
 
 
-def reorganize_content_for_compression(text):
-    """重组内容以提高压缩率"""
-    lines = text.split('\n')
+def compress_with_dictionary(data, method='zlib'):
+    """使用预置字典压缩提高压缩率，解压时需要同一个字典"""
+    if method == 'zlib':
+        compressor = zlib.compressobj(level=9, wbits=15, memLevel=9, strategy=zlib.Z_DEFAULT_STRATEGY,
+                                      zdict=_ZLIB_DICTIONARY)
+        return compressor.compress(data) + compressor.flush()
+    else:
+        return zlib.compress(data, level=9)
 
-    # 分类收集内容
-    text_sections = []
-    binary_sections = []
-    directory_sections = []
 
-    current_section = []
-    current_file_path = ""
-
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
-        if line.startswith('@'):
-            # 处理之前的section
-            if current_section and current_file_path:
-                section_content = '\n'.join(current_section)
-                full_section = f"@{current_file_path}\n{section_content}\n"
-
-                if section_content.startswith('B\n'):
-                    # 二进制文件
-                    binary_sections.append(full_section)
-                elif '[EMPTY_DIRECTORY]' in section_content:
-                    # 空目录
-                    directory_sections.append(full_section)
-                else:
-                    # 文本文件
-                    text_sections.append(full_section)
-
-            # 开始新section
-            current_file_path = line[1:]  # 移除@
-            current_section = []
-            i += 1
-
-            # 收集section内容
-            while i < len(lines) and not lines[i].startswith('@') and not lines[i].startswith('!'):
-                current_section.append(lines[i])
-                i += 1
-            continue
+def _decompress_zlib_ultra(compressed):
+    """解压ZLIB_ULTRA数据，兼容旧版本先把字典当作数据压缩、再丢弃zlib头生成的快照"""
+    try:
+        decompressor = zlib.decompressobj(zdict=_ZLIB_DICTIONARY)
+        return decompressor.decompress(compressed) + decompressor.flush()
+    except zlib.error:
+        # 旧格式：缺少zlib头的原始deflate流，解压结果以字典内容开头
+        data = zlib.decompressobj(-15).decompress(compressed)
+        if data.startswith(_ZLIB_DICTIONARY):
+            data = data[len(_ZLIB_DICTIONARY):]
+        return data
+
+
+def _create_stream_compressor(method, level=None):
+    """
+    创建流式压缩器，返回值支持 compress(data) 和 flush()
+
+    :param method: 'ZSTD' 或 'LZMA'
+    :param level: 压缩级别，None表示使用默认值
+    """
+    if method == 'ZSTD':
+        if zstandard is None:
+            raise RuntimeError("ZSTD压缩需要安装zstandard: pip install zstandard")
+        # threads=-1 使用所有CPU核心
+        if level is None:
+            level = DEFAULT_ZSTD_LEVEL
+        return zstandard.ZstdCompressor(level=level, threads=-1).compressobj()
+    if method == 'LZMA':
+        preset = DEFAULT_LZMA_PRESET if level is None else level
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=preset)
+    raise ValueError(f"不支持的压缩方法: {method}")
+
+
+def _decompress_by_method(method, compressed):
+    """按快照中记录的压缩方法解压数据，返回bytes"""
+    if method in ('LZMA', 'LZMA_EXTREME'):
+        return lzma.decompress(compressed)
+    if method in ('BZ2', 'BZ2_MAX'):
+        return bz2.decompress(compressed)
+    if method == 'ZLIB':
+        return zlib.decompress(compressed)
+    if method == 'ZLIB_ULTRA':
+        return _decompress_zlib_ultra(compressed)
+    if method == 'ZSTD':
+        if zstandard is None:
+            raise RuntimeError("此快照使用ZSTD压缩，需要安装zstandard: pip install zstandard")
+        # 流式写入的帧不带内容长度，使用decompressobj解压
+        return zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+    raise ValueError(f"不支持的压缩方法: {method}")
+
+
+# 方法标记以此结尾的压缩数据使用base64编码（C实现，远快于纯Python的base85）；
+# 不带后缀的标记来自旧版快照，仍按base85解码
+_BASE64_TAG_SUFFIX = '64'
+
+# base64/base85编码字符表，验证时用bytes.translate删除这些字符，剩下的就是非法字符
+_BASE64_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+_BASE85_ALPHABET = b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz!#$%&()*+-;<=>?@^_`{|}~'
+
+
+def _encode_compressed_payload(method, compressed):
+    """把压缩数据编码为快照中的 '方法标记:数据' 文本"""
+    return f"{method}{_BASE64_TAG_SUFFIX}:{_b64.b64encode(compressed).decode('ascii')}"
+
+
+def _decode_compressed_payload(compressed_content):
+    """
+    解析快照中 COMPRESSED 行之后的 '方法标记:数据' 文本，返回 (压缩方法, 压缩数据)
+    RAW 方法返回原始文本的UTF-8字节；没有方法标记的旧格式按LZMA处理
+    """
+    if ':' in compressed_content:
+        method, encoded_data = compressed_content.split(':', 1)
+    else:
+        # 兼容旧格式，默认使用LZMA
+        method = 'LZMA'
+        encoded_data = compressed_content
+
+    if method == 'RAW':
+        return method, encoded_data.encode('utf-8')
+    if method.endswith(_BASE64_TAG_SUFFIX):
+        return method[:-len(_BASE64_TAG_SUFFIX)], _b64.b64decode(encoded_data)
+    return method, base64.b85decode(encoded_data.encode('ascii'))
+
+
+def _classify_entry(file_path, binary_check_func):
+    """判断条目类型：'dir'、'binary' 或 'text'"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return 'binary' if binary_check_func(file_path) else 'text'
+    if stat.S_ISDIR(st.st_mode):
+        return 'dir'
+    return 'binary' if binary_check_func(file_path, st.st_size) else 'text'
+
+
+def _build_compressed_entry(relative_path, file_path, binary_check_func):
+    """
+    读取并编码单个条目，返回该条目在快照中的完整文本（简化的@格式）
+    可在工作线程中调用；出错时抛出异常，由调用方记录错误标记
+    """
+    # 检查是否为目录
+    if os.path.isdir(file_path):
+        return f"\n@{relative_path}\n[EMPTY_DIRECTORY]\n\n"
 
-        i += 1
+    # 文件只读取一次，base64编码和文本解码都使用同一份字节，不再为每种处理方式重新打开文件
+    with open(file_path, 'rb') as in_f:
+        raw = in_f.read()
 
-    # 处理最后一个section
-    if current_section and current_file_path:
-        section_content = '\n'.join(current_section)
-        full_section = f"@{current_file_path}\n{section_content}\n"
+    # 检查是否为二进制文件
+    if binary_check_func(file_path, len(raw)):
+        # 二进制文件使用base64编码
+        content = _b64.b64encode(raw).decode('ascii')
+        return f"\n@{relative_path}\nB\n{content}\n\n"  # 简化二进制标记
 
-        if section_content.startswith('B\n'):
-            binary_sections.append(full_section)
-        elif '[EMPTY_DIRECTORY]' in section_content:
-            directory_sections.append(full_section)
+    # 文本文件按原始字节解码，保留原有的换行符 - Windows编码优化
+    try:
+        content = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        # Windows编码回退
+        encodings = ['cp1252', 'utf-16', 'latin1'] if IS_WINDOWS else ['latin1']
+        for encoding in encodings:
+            try:
+                content = raw.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
         else:
-            text_sections.append(full_section)
+            # 编码失败，作为二进制处理
+            content = _b64.b64encode(raw).decode('ascii')
+            return f"\n@{relative_path}\nB\n{content}\n"
 
-    # 重新组织：目录 -> 文本文件 -> 二进制文件
-    return ''.join(directory_sections + text_sections + binary_sections)
+    return f"\n@{relative_path}\n{content}\n"
 
 
-def compress_with_dictionary(data, method='zlib'):
-    """使用字典压缩提高压缩率"""
-    # 构建压缩字典（基于常见的文件内容模式）
-    dictionary = b''.join([
-        b'@', b'\n', b'B\n', b'[EMPTY_DIRECTORY]', b'def ', b'class ',
-        b'import ', b'from ', b'function', b'var ', b'const ',
-        b'<html>', b'<head>', b'<body>', b'</html>', b'</head>', b'</body>',
-        b'<?xml', b'encoding=', b'utf-8', b'<!DOCTYPE',
-        b'{', b'}', b'[', b']', b'(', b')', b';', b',', b':', b'"'
-    ])
+def _stream_compression_level(original_size):
+    """按原始数据大小选择流式压缩级别；未安装zstandard（使用LZMA）时返回None，即LZMA的默认级别"""
+    if zstandard is None:
+        return None
+    if original_size < SMALL_INPUT_SIZE:
+        return SMALL_INPUT_ZSTD_LEVEL
+    if original_size >= STREAM_COMPRESSION_THRESHOLD:
+        return LARGE_INPUT_ZSTD_LEVEL
+    return DEFAULT_ZSTD_LEVEL
 
-    if method == 'zlib':
-        compressor = zlib.compressobj(level=9, wbits=15, memLevel=9, strategy=zlib.Z_DEFAULT_STRATEGY)
-        # ZLIB不直接支持字典，但我们可以预压缩字典来训练压缩器
-        compressor.compress(dictionary)
-        compressed = compressor.compress(data)
-        compressed += compressor.flush()
-        return compressed
-    else:
-        return zlib.compress(data, level=9)
+
+def _write_compressed_snapshot_stream(files_to_process, output_file, binary_check_func, show_progress_callback=None,
+                                      level=None):
+    """
+    流式创建压缩快照：逐个条目送入压缩器，压缩输出按3字节对齐分段做base64编码后直接写入文件
+    内存占用与单个文件大小相关，而不是与整个快照大小相关；输出格式与内存压缩的格式一致
+    安装了zstandard时使用ZSTD，否则使用LZMA
+
+    :param level: 压缩级别，None表示使用该方法的默认级别
+    """
+    method = 'ZSTD' if zstandard is not None else 'LZMA'
+
+    # 按 目录 -> 文本文件 -> 二进制文件 排序，与 reorganize_content_for_compression 的重组效果相同
+    # 类型判断需要读取文件开头，交给线程池并行完成
+    directories = []
+    text_files = []
+    binary_files = []
+    classify = lambda item: _classify_entry(item[1], binary_check_func)
+    for item, future in _prefetch_ordered(classify, files_to_process):
+        kind = future.result()
+        if kind == 'dir':
+            directories.append(item)
+        elif kind == 'binary':
+            binary_files.append(item)
+        else:
+            text_files.append(item)
+
+    compressor = _create_stream_compressor(method, level)
+    total_files = len(files_to_process)
+    processed_count = 0
+
+    with open(output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as out_f:
+        out_f.write(f"COMPRESSED\n{method}{_BASE64_TAG_SUFFIX}:")
+        pending = b''
+
+        def emit(data):
+            # base64以3字节为一组，只编码完整的组，剩余字节留到下一次，保证中间不出现填充
+            nonlocal pending
+            if not data:
+                return
+            data = pending + data
+            cut = len(data) - len(data) % 3
+            if cut:
+                out_f.write(_b64.b64encode(data[:cut]).decode('ascii'))
+            pending = data[cut:]
+
+        for relative_path, file_path in directories:
+            emit(compressor.compress(f"\n@{relative_path}\n[EMPTY_DIRECTORY]\n\n".encode('utf-8')))
+            processed_count += 1
+            if show_progress_callback:
+                show_progress_callback(processed_count, total_files)
+
+        # 小文件由线程池提前读入，与当前线程中的压缩重叠进行（文件读取和LZMA/ZSTD压缩都会释放GIL）
+        entries = [(r, p, False) for r, p in text_files] + [(r, p, True) for r, p in binary_files]
+        prefetched = _prefetch_ordered(lambda item: _read_small_file(item[1]), entries)
+        for (relative_path, file_path, is_binary), future in prefetched:
+            try:
+                data = future.result()
+                if is_binary:
+                    # 二进制文件：小文件一次编码，大文件分块编码后送入压缩器，不在内存中保留整个文件
+                    emit(compressor.compress(f"\n@{relative_path}\nB\n".encode('utf-8')))
+                    if data is not None:
+                        emit(compressor.compress(_b64.b64encode(data)))
+                    else:
+                        for encoded in _iter_base64_chunks(file_path):
+                            emit(compressor.compress(encoded))
+                    emit(compressor.compress(b"\n\n"))
+                    processed_count += 1
+                else:
+                    # 条目头、内容、结尾分别送入压缩器，不为拼接复制整个文件内容
+                    header = f"\n@{relative_path}\n".encode('utf-8')
+                    trailer = b"\n"
+                    raw = data
+                    if raw is None:
+                        # 大文本文件：已送入压缩器的内容无法撤回，而回退编码必须覆盖整个文件，结果才与其它快照模式一致
+                        # 开头的纯ASCII块在latin1回退下解码结果不变，边校验边送入；遇到第一个非ASCII块后停止送入，
+                        # 把剩余内容完整校验一遍，通过后再从该位置重新读取送入压缩器，只有含非ASCII内容的大文件读取两次
+                        # Windows的回退编码包含utf-16，ASCII内容也会解码成不同结果，因此整个文件校验通过后才送入
+                        sent = 0
+                        streaming = not IS_WINDOWS
+                        try:
+                            for chunk in _classify_and_stream(file_path):
+                                if streaming and chunk.isascii():
+                                    if header:
+                                        emit(compressor.compress(header))
+                                        header = b''
+                                    emit(compressor.compress(chunk))
+                                    sent += len(chunk)
+                                else:
+                                    streaming = False
+                            is_utf8 = True
+                        except UnicodeDecodeError:
+                            is_utf8 = False
+                        with open(file_path, 'rb') as in_f:
+                            in_f.seek(sent)
+                            if is_utf8:
+                                # 剩余内容已校验通过，分块原样送入压缩器
+                                emit(compressor.compress(header))
+                                header = b''
+                                for chunk in iter(lambda: in_f.read(1 << 20), b''):
+                                    emit(compressor.compress(chunk))
+                                raw = b''
+                            else:
+                                # 不是合法的UTF-8：已送入的只有ASCII开头，剩余内容走下面的编码回退
+                                raw = in_f.read()
+                    try:
+                        if not raw.isascii():
+                            raw.decode('utf-8')  # 仅用于校验，写入时直接使用原始字节
+                        body = raw
+                    except UnicodeDecodeError:
+                        encodings = ['cp1252', 'utf-16', 'latin1'] if IS_WINDOWS else ['latin1']
+                        for encoding in encodings:
+                            try:
+                                body = raw.decode(encoding).encode('utf-8')
+                                break
+                            except UnicodeDecodeError:
+                                continue
+                        else:
+                            # 所有编码都失败，作为二进制文件处理
+                            header += b"B\n"
+                            body = _b64.b64encode(raw)
+                            trailer = b"\n\n"
+                    emit(compressor.compress(header))
+                    emit(compressor.compress(body))
+                    emit(compressor.compress(trailer))
+                    processed_count += 1
+            except Exception as e:
+                emit(compressor.compress(f"\n!{relative_path}\n{str(e)}\n".encode('utf-8')))
+
+            if show_progress_callback:
+                show_progress_callback(processed_count, total_files)
+
+        emit(compressor.flush())
+        if pending:
+            out_f.write(_b64.b64encode(pending).decode('ascii'))
 
 
 def gather_files_to_txt_compressed(input_path, show_progress_callback=None):
     """将文件夹或文件内容在内存中合并并压缩，然后写入一个txt文件"""
+    # 只在入口处解析用户输入的路径；由它拼接出的输出路径和扫描得到的路径无需再次resolve
     input_path = get_safe_path(input_path)
     
     # 确定输出文件路径
     if os.path.isfile(input_path):
         base_name = os.path.basename(input_path)
-        initial_output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"compressed_{base_name}.txt")))
+        initial_output_file = Path(os.path.join(os.path.dirname(input_path), f"compressed_{base_name}.txt"))
         files_to_process = [(os.path.basename(input_path), input_path)]
+        original_size = os.path.getsize(input_path)  # 记录原始文件总大小
     else:
         folder_name = os.path.basename(os.path.normpath(input_path))
-        initial_output_file = Path(get_safe_path(os.path.join(os.path.dirname(input_path), f"compressed_files_{folder_name}.txt")))
-        base_path = os.path.normpath(input_path)
-        files_to_process = []
-        
-        # 收集所有文件和空目录
-        for root, dirs, files in os.walk(input_path):
-            # 添加文件
-            for file in files:
-                file_path = get_safe_path(os.path.join(root, file))
-                relative_path = os.path.relpath(file_path, start=base_path).replace(os.sep, '/')
-                files_to_process.append((relative_path, file_path))
-            
-            # 添加空目录
-            for dir_name in dirs:
-                dir_path = get_safe_path(os.path.join(root, dir_name))
-                # 检查是否为空目录
-                if not os.listdir(dir_path):
-                    relative_path = os.path.relpath(dir_path, start=base_path).replace(os.sep, '/')
-                    files_to_process.append((relative_path, dir_path))
+        initial_output_file = Path(os.path.join(os.path.dirname(input_path), f"compressed_files_{folder_name}.txt"))
+
+        # 收集所有文件和空目录，文件大小直接取自遍历时的stat结果
+        scanned = _scan_tree(input_path, with_stat=True)
+        files_to_process = [(relative_path, file_path) for relative_path, file_path, _ in scanned]
+        original_size = sum(st.st_size for _, _, st in scanned if not stat.S_ISDIR(st.st_mode))
 
     output_file = Path(get_unique_filepath(str(initial_output_file)))
 
     # Windows优化：选择合适的二进制检测函数
-    if platform.system() == 'Windows':
+    if IS_WINDOWS:
         binary_check_func = is_binary_file_windows_optimized
         print_colored("💡 Windows压缩优化模式启用", 'blue')
     else:
         binary_check_func = is_binary_file
 
-    # 在内存中构建内容，使用更紧凑的格式
-    content_parts = []
-    total_files = len(files_to_process)
-    original_size = 0  # 记录原始文件总大小
-    processed_count = 0
-
-    for relative_path, file_path in files_to_process:
-        try:
-            content_parts.append(f"\n@{relative_path}\n")  # 简化标记，移除@F前缀
-            # 检查是否为目录
-            if os.path.isdir(file_path):
-                original_size += 0  # 目录大小为0
-                content_parts.append("[EMPTY_DIRECTORY]\n")
-            else:
-                original_size += os.path.getsize(file_path)  # 直接获取文件大小
-                # 检查是否为二进制文件
-                if binary_check_func(file_path):
-                    # 二进制文件使用base64编码
-                    with open(file_path, 'rb') as in_f:
-                        content = base64.b64encode(in_f.read()).decode('ascii')
-                        content_parts.append(f"B\n{content}\n")  # 简化二进制标记
-                else:
-                    # 文本文件直接读取 - Windows编码优化
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as in_f:
-                            content = in_f.read()
-                    except UnicodeDecodeError:
-                        # Windows编码回退
-                        encodings = ['cp1252', 'utf-16', 'latin1'] if platform.system() == 'Windows' else ['latin1']
-                        content = ""
-                        for encoding in encodings:
-                            try:
-                                with open(file_path, 'r', encoding=encoding) as in_f:
-                                    content = in_f.read()
-                                break
-                            except UnicodeDecodeError:
-                                continue
-                        else:
-                            # 编码失败，作为二进制处理
-                            with open(file_path, 'rb') as in_f:
-                                content = base64.b64encode(in_f.read()).decode('ascii')
-                                content_parts.append(f"B\n{content}\n")
-                                processed_count += 1
-                                if show_progress_callback:
-                                    show_progress_callback(processed_count, total_files)
-                                continue
+    # 大体积输入，或安装了zstandard时：流式压缩，避免在内存中同时保留快照文本、编码结果和压缩结果
+    # ZSTD只走流式压缩这一条路径，压缩级别按原始数据大小选择
+    if original_size >= STREAM_COMPRESSION_THRESHOLD or zstandard is not None:
+        level = _stream_compression_level(original_size)
+        print_colored("使用流式压缩模式" + (f" (ZSTD级别 {level})" if level is not None else "") + "...", 'blue')
+        _write_compressed_snapshot_stream(files_to_process, output_file, binary_check_func, show_progress_callback,
+                                          level=level)
+        compressed_size = os.path.getsize(output_file)
+        if original_size > 0:
+            ratio = (1 - compressed_size / original_size) * 100
+            print_colored(f"压缩比例: 原始大小 {original_size/1024:.2f} KB → 压缩后 {compressed_size/1024:.2f} KB (减少 {ratio:.2f}%) ", 'blue')
+    else:
+        # 在内存中构建内容，使用更紧凑的格式
+        # 文件读取、类型判断和base64编码交给线程池并行完成，结果按原顺序拼接
+        content_parts = []
+        total_files = len(files_to_process)
+        processed_count = 0
 
-                    content_parts.append(content)
-            content_parts.append("\n")
+        build = lambda item: _build_compressed_entry(item[0], item[1], binary_check_func)
+        for (relative_path, file_path), future in _prefetch_ordered(build, files_to_process):
+            try:
+                content_parts.append(future.result())
+                processed_count += 1
+            except Exception as e:
+                content_parts.append(f"\n!{relative_path}\n{str(e)}\n")  # 简化错误标记
 
-            processed_count += 1
-        except Exception as e:
-            content_parts.append(f"\n!{relative_path}\n{str(e)}\n")  # 简化错误标记
+            if show_progress_callback:
+                show_progress_callback(processed_count, total_files)
 
-        if show_progress_callback:
-            show_progress_callback(processed_count, total_files)
+        # 使用自定义分隔符而不是长分隔线
+        full_content = "".join(content_parts)
 
-    # 使用自定义分隔符而不是长分隔线
-    full_content = "".join(content_parts)
+        # 使用高级压缩算法
+        compressed_content = compress_text_advanced(full_content)
 
-    # 使用高级压缩算法
-    compressed_content = compress_text_advanced(full_content)
+        # 压缩标识单独写在内容开头，使用更短的标识符，不为拼接复制整个压缩结果
+        header = "COMPRESSED\n"
 
-    # 将压缩标识添加到压缩后的内容开头，使用更短的标识符
-    compressed_content = "COMPRESSED\n" + compressed_content
-    
-    compressed_size = len(compressed_content.encode('utf-8'))  # 获取压缩后大小
+        # 获取压缩后大小；编码后的压缩数据是纯ASCII，字符数即字节数（RAW回退时才需要编码计算）
+        if compressed_content.isascii():
+            compressed_size = len(header) + len(compressed_content)
+        else:
+            compressed_size = len(header) + len(compressed_content.encode('utf-8'))
     
-    # 计算并显示压缩比例
-    if original_size > 0:
-        ratio = (1 - compressed_size / original_size) * 100
-        print_colored(f"压缩比例: 原始大小 {original_size/1024:.2f} KB → 压缩后 {compressed_size/1024:.2f} KB (减少 {ratio:.2f}%) ", 'blue')
+        # 计算并显示压缩比例
+        if original_size > 0:
+            ratio = (1 - compressed_size / original_size) * 100
+            print_colored(f"压缩比例: 原始大小 {original_size/1024:.2f} KB → 压缩后 {compressed_size/1024:.2f} KB (减少 {ratio:.2f}%) ", 'blue')
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(compressed_content)
+        with open(output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(header)
+            f.write(compressed_content)
 
     # 进行快速完整性检查
     print_colored("\n⚡ 正在进行快速验证...", 'blue')
@@ -1033,6 +1647,111 @@ def gather_files_to_txt_compressed(input_path, show_progress_callback=None):
     return output_file
 
 
+# 以@开头但不是文件标记的行：CSS的@规则、常见的Python装饰器，以及包含 def/class 的行
+# 合并为一个预编译正则，用match从@处匹配，一次扫描完成全部判断
+_NON_ENTRY_AT_PATTERN = (r'@\s*(?:keyframes|media|import|charset|font-face|'
+                         r'app\.route|staticmethod|classmethod|property)|.*?(?:def |class )')
+_NON_ENTRY_AT_LINE = re.compile(_NON_ENTRY_AT_PATTERN.encode('ascii'))
+_NON_ENTRY_AT_LINE_STR = re.compile(_NON_ENTRY_AT_PATTERN)
+
+
+def _is_entry_marker_line(line):
+    """判断以@开头的行是否为文件标记，line为不含换行符的bytes"""
+    return len(line) > 1 and not _NON_ENTRY_AT_LINE.match(line)
+
+
+def _iter_snapshot_entries(buf, has_header=True):
+    """
+    扫描未压缩快照内容，按顺序产出 (类型, 路径, 内容起始, 内容结束)
+    buf 为bytes或mmap；类型为 'dir'、'binary'、'text' 或 'error'
+    has_header 为True时 buf 的第一行是格式标识行；为False时（解压后的快照内容）开头视为有一个隐含的换行，
+    首个条目可以直接以@或!开头，调用方无需为补换行复制整个内容
+    只用 find 在 '\n@' 和 '\n!' 处跳转，不逐行切分整个快照；内容以偏移量返回，由调用方切片
+    二进制条目的内容为base64数据，错误条目的内容为错误信息
+    """
+    find = buf.find  # 循环内频繁调用，绑定为局部变量
+    size = len(buf)
+    if has_header:
+        header_end = find(b'\n')
+        if header_end == -1:
+            return
+        first_newline = header_end
+    else:
+        header_end = -1
+        first_newline = find(b'\n')
+    # 快照被转换为CRLF换行时，标记行和分隔行都带有\r（按下标取值得到int，13为\r，10为\n）
+    crlf = first_newline > 0 and buf[first_newline - 1] == 13
+
+    def make_entry(marker, path, body_start, body_end):
+        # 去掉条目末尾的分隔换行
+        if crlf and body_end > body_start and buf[body_end - 1] == 13:
+            body_end -= 1
+        if body_end > body_start and buf[body_end - 1] == 10:
+            body_end -= 1
+        if crlf and body_end > body_start and buf[body_end - 1] == 13:
+            body_end -= 1
+        path = path.decode('utf-8', errors='replace')
+        if marker == b'!':
+            return 'error', path, body_start, body_end
+
+        first_end = find(b'\n', body_start, body_end)
+        if first_end == -1:
+            first_end = body_end
+        # 只有首行为 [EMPTY_DIRECTORY] 或 B 时才需要比较，先用长度过滤
+        first_len = first_end - body_start
+        if crlf and first_len and buf[first_end - 1] == 13:
+            first_len -= 1
+        if first_len == 17 and buf[body_start:body_start + 17] == b'[EMPTY_DIRECTORY]':
+            return 'dir', path, body_start, body_start
+        if first_len == 1 and buf[body_start] == 66:  # 'B'
+            return 'binary', path, min(first_end + 1, body_end), body_end
+        return 'text', path, body_start, body_end
+
+    current = None
+    pos = max(header_end, 0)
+    if not has_header and buf[:1] in (b'@', b'!'):
+        # 没有格式标识行时，开头的标记行前面没有换行，单独判断
+        line_end = first_newline if first_newline != -1 else size
+        line = buf[:line_end]
+        if crlf and line.endswith(b'\r'):
+            line = line[:-1]
+        if line[:1] == b'!' or _is_entry_marker_line(line):
+            current = (line[:1], line[1:], line_end + 1)
+            pos = line_end
+    next_at = find(b'\n@', pos)
+    next_bang = find(b'\n!', pos)
+    while next_at != -1 or next_bang != -1:
+        if next_bang == -1 or (next_at != -1 and next_at < next_bang):
+            newline_pos = next_at
+        else:
+            newline_pos = next_bang
+        line_start = newline_pos + 1
+        line_end = find(b'\n', line_start)
+        if line_end == -1:
+            line_end = size
+        line = buf[line_start:line_end]
+        if crlf and line.endswith(b'\r'):
+            line = line[:-1]
+
+        marker = line[:1]
+        if marker == b'!' or _is_entry_marker_line(line):
+            if current is not None:
+                yield make_entry(current[0], current[1], current[2], newline_pos)
+            current = (marker, line[1:], line_end + 1)
+            pos = line_end
+        else:
+            # 文件内容中以@开头的普通行（CSS规则、装饰器等）
+            pos = line_start
+
+        if next_at != -1 and next_at < pos:
+            next_at = find(b'\n@', pos)
+        if next_bang != -1 and next_bang < pos:
+            next_bang = find(b'\n!', pos)
+
+    if current is not None:
+        yield make_entry(current[0], current[1], min(current[2], size), size)
+
+
 def restore_files_from_txt(txt_path, output_folder):
     """
     从合并的文本文件恢复原始文件
@@ -1061,183 +1780,105 @@ def restore_files_from_txt(txt_path, output_folder):
         restore_files_from_compressed_txt(txt_path, output_folder)
         return  # 压缩恢复完成后直接返回
     elif first_line == "UNCOMPRESSED":
-        # 移除格式标识行后调用原始恢复逻辑
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            content = f.read().split('\n', 1)[1]  # 跳过第一行
-        
-        os.makedirs(output_folder, exist_ok=True)
-        
-        # 分割文件和目录块 - 使用新的简化@格式
-        parts = []
-        current_item = None
-        lines = content.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            
-            # 检查是否为有效的文件标记（@后跟路径，不是CSS的@规则）
-            # 检查是否为有效的文件标记（@后跟路径，不是CSS的@规则或Python装饰器）
-            if (line.startswith('@') and len(line) > 1 and 
-                not line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face')) and
-                not line[1:].strip().startswith(('app.route', 'staticmethod', 'classmethod', 'property')) and
-                not 'def ' in line and not 'class ' in line):
-                if current_item:
-                    parts.extend(current_item)
-                
-                file_path = line[1:]  # 移除@前缀
-
-                # 收集内容直到下一个有效的文件标记或错误标记
-                content_lines = []
-                i += 1
-                while i < len(lines):
-                    next_line = lines[i]
-                    # 如果遇到新的文件标记或错误标记，停止收集
-                    if (next_line.startswith('@') and len(next_line) > 1 and not next_line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face'))) or next_line.startswith('!'):
-                        break
-                    content_lines.append(next_line)
-                    i += 1
-
-                # 处理内容
-                if content_lines and content_lines[0] == 'B':
-                    # 二进制文件
-                    content_block = "[BINARY_FILE_BASE64]\n" + '\n'.join(content_lines[1:])
-                elif content_lines and content_lines[0] == '[EMPTY_DIRECTORY]':
-                    # 空目录
-                    content_block = "[EMPTY_DIRECTORY]"
-                else:
-                    # 文本文件，保持所有内容包括行尾空白
-                    # 移除最后的空行（如果有的话），因为写入时会自动添加换行符
-                    if content_lines and content_lines[-1] == '':
-                        content_lines = content_lines[:-1]
-                    content_block = '\n'.join(content_lines)
-
-                current_item = ["文件", file_path, content_block]
-            elif line.startswith('!'):
-                # 错误文件
-                if current_item:
-                    parts.extend(current_item)
-                
-                file_path = line[1:]  # 移除!前缀
-                error_content = lines[i+1] if i+1 < len(lines) else ""
-                current_item = ["文件", file_path, f"ERROR: {error_content}"]
-                i += 2
+        pass
+    else:
+        print_colored("错误: 无法识别的文件格式!", 'red')
+        return  # 添加返回语句，避免继续执行后面的代码
 
-            else:
-                # 如果不是文件标记，可能是之前文件内容的一部分，继续处理
-                if current_item:
-                    # 将当前行添加到当前项目的内容中
-                    current_item[2] += '\n' + line
-                i += 1
-        
-        # 添加最后一个项目
-        if current_item:
-            parts.extend(current_item)
-        
-        # 确保我们有正确的格式：类型、路径、内容循环
-        if len(parts) % 3 != 0:
-            print_colored("警告: 快照文件格式可能已损坏。", 'yellow')
-            return
+    # 错误跟踪和统计
+    success_count = 0
+    error_count = 0
+    error_details = []
 
-        total_blocks = len(parts) // 3
+    # 内存映射整个快照，按偏移量切片写出，不把快照解码成str后再逐行切分
+    with open(txt_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        entries = list(_iter_snapshot_entries(mm))
+
+        total_blocks = len(entries)
         if total_blocks == 0:
             print_colored("警告: 未在文件中找到任何有效的文件块。", 'yellow')
             return
-    else:
-        print_colored("错误: 无法识别的文件格式!", 'red')
-        return  # 添加返回语句，避免继续执行后面的代码
 
-    # 恢复逻辑 - 增强错误恢复和验证
-    show_progress(0, total_blocks, "恢复进度:")
-    
-    # 错误跟踪和统计
-    success_count = 0
-    error_count = 0
-    error_details = []
-    
-    for i in range(0, len(parts), 3):
-        if i + 2 >= len(parts):
-            break
+        os.makedirs(output_folder, exist_ok=True)
+
+        # 恢复逻辑 - 增强错误恢复和验证
+        show_progress(0, total_blocks, "恢复进度:")
 
-        block_type = parts[i]        # "文件" 或 "目录"
-        file_path = parts[i+1]       # 路径
-        content_block = parts[i+2]   # 内容
-        
-        # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
-        sanitized_file_path = sanitize_file_path(file_path)
-        # 使用 Path 对象确保正确的路径连接
-        full_path = str(Path(output_folder) / sanitized_file_path)
-        
-        try:
-            if content_block.strip() == "[EMPTY_DIRECTORY]":
+        # 已确认存在的目录，避免对同一父目录反复调用makedirs
+        ensured_dirs = {output_folder}
+        # 工作线程产生的备份提示（list.append是线程安全的）
+        backup_notices = []
+
+        def restore_entry(entry):
+            # 在工作线程中恢复单个条目，异常由主线程按类型记录
+            kind, sanitized_file_path, start, end = entry
+            full_path = os.path.join(output_folder, sanitized_file_path)
+
+            if kind == 'dir':
                 # 创建空目录
-                os.makedirs(full_path, exist_ok=True)
-                success_count += 1
+                _ensure_directory(full_path, ensured_dirs)
+                return
 
-            else:  # 文件
-                # 确保父目录存在，使用 Path 对象处理
-                parent_dir = Path(full_path).parent
-                if parent_dir != Path('.'):  # 确保不是当前目录
-                    parent_dir.mkdir(parents=True, exist_ok=True)
+            # 确保父目录存在
+            _ensure_directory(os.path.dirname(full_path), ensured_dirs)
 
-                # 检查是否为二进制文件
-                if content_block.strip().startswith("[BINARY_FILE_BASE64]"):
-                    # 二进制文件
-                    base64_content = content_block.split('\n', 1)[1]
+            # 备份已存在的文件；备份提示由主线程在进度循环结束后统一输出，不打断进度条
+            if os.path.exists(full_path):
+                backup_existing_file(full_path, backup_notices)
 
-                    # 备份已存在的文件
-                    if os.path.exists(full_path):
-                        backup_existing_file(full_path)
+            if kind == 'binary':
+                # 二进制文件
+                with open(full_path, 'wb') as out_f:
+                    _decode_base64_to_file(mm[start:end], out_f)
+            elif kind == 'error':
+                # 创建快照时读取失败的文件，写入错误信息
+                _write_bytes_to_path(full_path, b"ERROR: " + mm[start:end])
+            else:
+                # 文本文件，直接从映射区域写出原始字节，不复制内容
+                # 视图用完立即释放：写入失败时异常会随future保留，不能让它继续引用映射区域
+                with memoryview(mm) as view, view[start:end] as body:
+                    _write_bytes_to_path(full_path, body)
 
-                    with open(full_path, 'wb') as f:
-                        f.write(base64.b64decode(base64_content.encode('ascii')))
-                    success_count += 1
+        # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
+        entries = [(kind, sanitize_file_path(file_path), start, end) for kind, file_path, start, end in entries]
 
-                else:
-                    # 文本文件，保持原始内容
+        # 写入交给线程池并行完成（文件写入和创建目录时释放GIL），结果按原顺序统计
+        # 快照中有重复路径时（如文件列表中的同名文件）保持串行，保证后出现的条目覆盖先出现的
+        has_duplicates = _has_duplicate_paths(entry[1] for entry in entries)
+        restored = _prefetch_ordered(restore_entry, entries, max_workers=1 if has_duplicates else None)
 
-                    # 备份已存在的文件
-                    if os.path.exists(full_path):
-                        backup_existing_file(full_path)
+        for index, ((kind, sanitized_file_path, start, end), future) in enumerate(restored, 1):
+            try:
+                future.result()
+                success_count += 1
 
-                    with open(full_path, 'w', encoding='utf-8') as f:
-                        f.write(content_block)
-                    success_count += 1
-                    
-        except OSError as e:
-            # 文件系统错误（权限、磁盘空间等）
-            error_msg = f"文件系统错误: {sanitized_file_path} - {str(e)}"
-            # 提供更具体的权限错误信息
-            if e.errno == 13:  # Permission denied
-                error_msg += " (权限被拒绝，请检查文件权限或以管理员身份运行)"
-            elif e.errno == 28:  # No space left on device
-                error_msg += " (磁盘空间不足，请清理磁盘空间)"
-            print_colored(f"警告: {error_msg}", 'yellow')
-            error_count += 1
-            error_details.append(error_msg)
-            
-        except (ValueError, base64.binascii.Error) as e:
-            # Base64 解码错误
-            error_msg = f"Base64解码错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
-            error_count += 1
-            error_details.append(error_msg)
-            
-        except UnicodeDecodeError as e:
-            # 编码错误
-            error_msg = f"编码错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
-            error_count += 1
-            error_details.append(error_msg)
-            
-        except Exception as e:
-            # 其他未知错误
-            error_msg = f"未知错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
-            error_count += 1
-            error_details.append(error_msg)
-        
-        show_progress(i // 3 + 1, total_blocks, "恢复进度:")
+            except OSError as e:
+                # 文件系统错误（权限、磁盘空间等）
+                error_msg = f"文件系统错误: {sanitized_file_path} - {str(e)}"
+                # 提供更具体的权限错误信息
+                if e.errno == 13:  # Permission denied
+                    error_msg += " (权限被拒绝，请检查文件权限或以管理员身份运行)"
+                elif e.errno == 28:  # No space left on device
+                    error_msg += " (磁盘空间不足，请清理磁盘空间)"
+                error_count += 1
+                error_details.append(error_msg)
+
+            except (ValueError, base64.binascii.Error) as e:
+                # Base64 解码错误
+                error_msg = f"Base64解码错误: {sanitized_file_path} - {str(e)}"
+                error_count += 1
+                error_details.append(error_msg)
+
+            except Exception as e:
+                # 其他未知错误
+                error_msg = f"未知错误: {sanitized_file_path} - {str(e)}"
+                error_count += 1
+                error_details.append(error_msg)
+
+            show_progress(index, total_blocks, "恢复进度:")
+
+        for notice in backup_notices:
+            print_colored(*notice)
     
     # 生成恢复报告
     print()
@@ -1259,31 +1900,26 @@ def restore_files_from_txt(txt_path, output_folder):
 
 def compress_text(text):
     """压缩文本内容，智能选择最佳压缩策略，Windows优化版本"""
-    import zlib
-    import bz2
-
     # 预处理：保持所有原始内容，不移除空白
     processed_text = text
 
-    original_bytes = processed_text.encode('utf-8')
-    original_size = len(original_bytes)
-
     # Windows优化：对于小文件使用更快的压缩
-    size_threshold = 4096 if platform.system() == 'Windows' else 2048
+    size_threshold = 4096 if IS_WINDOWS else 2048
+
+    # UTF-8字节数不少于字符数：字符数达到阈值时必然走大文件路径，不必为判断大小编码整个文本
+    original_bytes = processed_text.encode('utf-8') if len(processed_text) < size_threshold else None
 
-    if original_size < size_threshold:
+    if original_bytes is not None and len(original_bytes) < size_threshold:
         print_colored("使用快速压缩模式（小文件优化）...", 'blue')
         try:
             # Windows上使用更快的ZLIB压缩
-            if platform.system() == 'Windows':
+            if IS_WINDOWS:
                 compressed = zlib.compress(original_bytes, level=6)  # 平衡速度和效果
-                encoded = base64.b85encode(compressed).decode('ascii')
-                return f"ZLIB:{encoded}"
+                return _encode_compressed_payload('ZLIB', compressed)
             else:
                 # 其他系统使用LZMA
                 compressed = lzma.compress(original_bytes, preset=6)
-                encoded = base64.b85encode(compressed).decode('ascii')
-                return encoded
+                return _encode_compressed_payload('LZMA', compressed)
         except:
             return processed_text  # 压缩失败则返回原文
 
@@ -1294,41 +1930,32 @@ def compress_text(text):
     reorganized_text = reorganize_content_for_compression(processed_text)
     reorganized_bytes = reorganized_text.encode('utf-8')
 
-    # 测试压缩算法 - Windows优化顺序
-    results = []
-
-    # Windows优先使用ZLIB（速度更快）
-    if platform.system() == 'Windows':
+    # 在数据开头试压各算法，只用胜出者压缩完整数据 - Windows优化顺序
+    # Windows优先使用ZLIB（速度更快）；LZMA使用preset=6，不再使用PRESET_EXTREME
+    if IS_WINDOWS:
         algorithms = [
             ('ZLIB', lambda data: zlib.compress(data, level=9)),
-            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=6 | lzma.PRESET_EXTREME)),
+            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=6)),
             ('BZ2', lambda data: bz2.compress(data, compresslevel=6))  # 降低压缩级别提高速度
         ]
     else:
         algorithms = [
-            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=9 | lzma.PRESET_EXTREME)),
+            ('LZMA', lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=6)),
             ('BZ2', lambda data: bz2.compress(data, compresslevel=9)),
             ('ZLIB', lambda data: zlib.compress(data, level=9))
         ]
 
-    for method, compress_func in algorithms:
-        try:
-            compressed = compress_func(reorganized_bytes)
-            encoded = base64.b85encode(compressed).decode('ascii')
-            results.append((method, encoded, len(encoded)))
-            print_colored(f"  {method}: {len(encoded)} 字符", 'blue')
-        except Exception as e:
-            print_colored(f"  {method}失败: {e}", 'yellow')
-
-    if not results:
+    best = _compress_best_of(reorganized_bytes, algorithms)
+    if best is None:
         print_colored("警告: 所有压缩算法都失败，使用原始文本", 'yellow')
         return f"RAW:{processed_text}"
 
-    # 选择最佳结果
-    best_method, best_compressed, best_size = min(results, key=lambda x: x[2])
-    print_colored(f"选择最佳算法: {best_method} (压缩后 {best_size} 字符)", 'green')
+    # 只对胜出的结果做一次base64编码
+    best_method, best_compressed = best
+    best_result = _encode_compressed_payload(best_method, best_compressed)
+    print_colored(f"选择最佳算法: {best_method} (压缩后 {len(best_result)} 字符)", 'green')
 
-    return f"{best_method}:{best_compressed}"
+    return best_result
 
 
 def restore_files_from_compressed_txt(txt_path, output_folder):
@@ -1348,45 +1975,26 @@ def restore_files_from_compressed_txt(txt_path, output_folder):
         compressed_content = f.read()
     
     try:
-        # 解析压缩格式和数据
-        if ':' in compressed_content:
-            method, encoded_data = compressed_content.split(':', 1)
-        else:
-            # 兼容旧格式，默认使用LZMA
-            method = 'LZMA'
-            encoded_data = compressed_content
-        
-        # 先解码base85
-        compressed = base64.b85decode(encoded_data.encode('ascii'))
+        # 解析压缩格式，并按方法标记解码base64/base85
+        method, compressed = _decode_compressed_payload(compressed_content)
         
-        # 根据压缩方法解压
-        if method == 'LZMA':
-            decompressed_content = lzma.decompress(compressed).decode('utf-8')
-        elif method == 'BZ2':
-            import bz2
-            decompressed_content = bz2.decompress(compressed).decode('utf-8')
-        elif method == 'ZLIB':
-            import zlib
-            decompressed_content = zlib.decompress(compressed).decode('utf-8')
-        elif method == 'RAW':
+        # 根据压缩方法解压，解压结果保持为bytes，按偏移量切片写出
+        if method == 'RAW':
             # 原始文本，无需解压
-            decompressed_content = encoded_data
-        # 新增高级压缩格式支持
-        elif method == 'LZMA_EXTREME':
-            decompressed_content = lzma.decompress(compressed).decode('utf-8')
-        elif method == 'ZLIB_ULTRA':
-            import zlib
-            decompressed_content = zlib.decompress(compressed).decode('utf-8')
-        elif method == 'BZ2_MAX':
-            import bz2
-            decompressed_content = bz2.decompress(compressed).decode('utf-8')
+            decompressed_content = compressed
+        elif method in ('LZMA', 'BZ2', 'ZLIB', 'LZMA_EXTREME', 'ZLIB_ULTRA', 'BZ2_MAX', 'ZSTD'):
+            decompressed_content = _decompress_by_method(method, compressed)
         else:
             print_colored(f"错误: 不支持的压缩方法 {method}", 'red')
             return
         
         # 显示解压比例和使用的算法
-        compressed_size = len(compressed_content.encode('utf-8'))
-        original_size = len(decompressed_content.encode('utf-8'))
+        # base64/base85编码的数据是纯ASCII，字符数即字节数（只有RAW可能包含非ASCII字符）
+        if compressed_content.isascii():
+            compressed_size = len(compressed_content)
+        else:
+            compressed_size = len(compressed_content.encode('utf-8'))
+        original_size = len(decompressed_content)
         if compressed_size > 0:
             ratio = (original_size / compressed_size) * 100
             print_colored(f"解压比例: 压缩文件 {compressed_size/1024:.2f} KB → 解压后 {original_size/1024:.2f} KB (原始大小的 {ratio:.2f}%) [算法: {method}]", 'blue')
@@ -1398,78 +2006,10 @@ def restore_files_from_compressed_txt(txt_path, output_folder):
     # 恢复文件内容
     os.makedirs(output_folder, exist_ok=True)
     
-    # 分割文件和目录块 - 使用新的简化@格式
-    parts = []
-    current_item = None
-    lines = decompressed_content.split('\n')
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        
-        # 检查是否为有效的文件标记（@后跟路径，不是CSS的@规则或Python装饰器）
-        if (line.startswith('@') and len(line) > 1 and 
-            not line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face')) and
-            not line[1:].strip().startswith(('app.route', 'staticmethod', 'classmethod', 'property')) and
-            not 'def ' in line and not 'class ' in line):
-            if current_item:
-                parts.extend(current_item)
-            
-            file_path = line[1:]  # 移除@前缀
-            
-            # 收集内容直到下一个有效的文件标记或错误标记
-            content_lines = []
-            i += 1
-            while i < len(lines):
-                next_line = lines[i]
-                # 如果遇到新的文件标记或错误标记，停止收集
-                if (next_line.startswith('@') and len(next_line) > 1 and not next_line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face'))) or next_line.startswith('!'):
-                    break
-                content_lines.append(next_line)
-                i += 1
-            
-            # 处理内容
-            if content_lines and content_lines[0] == 'B':
-                # 二进制文件
-                content = "[BINARY_FILE_BASE64]\n" + '\n'.join(content_lines[1:])
-            elif content_lines and content_lines[0] == '[EMPTY_DIRECTORY]':
-                # 空目录
-                content = "[EMPTY_DIRECTORY]"
-            else:
-                # 文本文件，移除最后的空行（如果有的话）
-                if content_lines and content_lines[-1] == '':
-                    content_lines = content_lines[:-1]
-                content = '\n'.join(content_lines)
-            
-            current_item = ["文件", file_path, content]
-            continue
-        elif line.startswith('!'):
-            # 错误文件
-            if current_item:
-                parts.extend(current_item)
-            
-            file_path = line[1:]  # 移除!前缀
-            error_content = lines[i+1] if i+1 < len(lines) else ""
-            current_item = ["文件", file_path, f"ERROR: {error_content}"]
-            i += 2
+    # 与未压缩快照共用同一个条目扫描器；解压后的内容没有格式标识行（重组后的内容直接以@开头）
+    entries = list(_iter_snapshot_entries(decompressed_content, has_header=False))
 
-        else:
-            # 如果不是文件标记，可能是之前文件内容的一部分，继续处理
-            if current_item:
-                # 将当前行添加到当前项目的内容中
-                current_item[2] += '\n' + line
-            i += 1
-    
-    # 添加最后一个项目
-    if current_item:
-        parts.extend(current_item)
-    
-    # 确保我们有正确的格式：类型、路径、内容循环
-    if len(parts) % 3 != 0:
-        print_colored("警告: 快照文件格式可能已损坏。", 'yellow')
-        return
-        
-    total_blocks = len(parts) // 3
+    total_blocks = len(entries)
     if total_blocks == 0:
         print_colored("警告: 未在文件中找到任何有效的文件块。", 'yellow')
         return
@@ -1482,74 +2022,70 @@ def restore_files_from_compressed_txt(txt_path, output_folder):
     error_count = 0
     error_details = []
     
-    for i in range(0, len(parts), 3):
-        if i + 2 >= len(parts):
-            break
+    # 已确认存在的目录，避免对同一父目录反复调用makedirs
+    ensured_dirs = {output_folder}
 
-        block_type = parts[i]        # "文件" 或 "目录"
-        file_path = parts[i+1]       # 路径
-        content_block = parts[i+2]   # 内容
-        
-        # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
-        sanitized_file_path = sanitize_file_path(file_path)
-        # 使用 Path 对象确保正确的路径连接
-        full_path = str(Path(output_folder) / sanitized_file_path)
-        
-        try:
-            if content_block.strip() == "[EMPTY_DIRECTORY]":
-                # 创建空目录
-                os.makedirs(full_path, exist_ok=True)
-                success_count += 1
+    def restore_entry(entry):
+        # 在工作线程中恢复单个条目，异常由主线程按类型记录
+        kind, sanitized_file_path, start, end = entry
+        full_path = os.path.join(output_folder, sanitized_file_path)
+
+        if kind == 'dir':
+            # 创建空目录
+            _ensure_directory(full_path, ensured_dirs)
+            return
 
-            else:  # 普通文件
-                # 确保父目录存在，使用 Path 对象处理
-                parent_dir = Path(full_path).parent
-                if parent_dir != Path('.'):  # 确保不是当前目录
-                    parent_dir.mkdir(parents=True, exist_ok=True)
+        # 确保父目录存在
+        _ensure_directory(os.path.dirname(full_path), ensured_dirs)
 
-                # 检查是否为二进制文件
-                if content_block.strip().startswith("[BINARY_FILE_BASE64]"):
-                    # 二进制文件
-                    base64_content = content_block.split('\n', 1)[1]
-                    with open(full_path, 'wb') as f:
-                        f.write(base64.b64decode(base64_content.encode('ascii')))
-                    success_count += 1
+        if kind == 'binary':
+            # 二进制文件
+            with open(full_path, 'wb') as f:
+                _decode_base64_to_file(decompressed_content[start:end], f)
+        elif kind == 'error':
+            # 创建快照时读取失败的文件，写入错误信息
+            _write_bytes_to_path(full_path, b"ERROR: " + decompressed_content[start:end])
+        else:
+            # 文本文件，保持原始内容，直接写出解压结果中的字节区间，不复制内容
+            _write_bytes_to_path(full_path, memoryview(decompressed_content)[start:end])
 
-                else:
-                    # 文本文件，保持原始内容
-                    with open(full_path, 'w', encoding='utf-8') as f:
-                        f.write(content_block)
-                    success_count += 1
+    # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
+    entries = [(kind, sanitize_file_path(file_path), start, end) for kind, file_path, start, end in entries]
+
+    # 与未压缩快照的恢复相同：并行写入，有重复路径时保持串行
+    has_duplicates = _has_duplicate_paths(entry[1] for entry in entries)
+    restored = _prefetch_ordered(restore_entry, entries, max_workers=1 if has_duplicates else None)
+
+    for index, ((kind, sanitized_file_path, start, end), future) in enumerate(restored, 1):
+        try:
+            future.result()
+            success_count += 1
                     
         except OSError as e:
             # 文件系统错误（权限、磁盘空间等）
             error_msg = f"文件系统错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
             
         except (ValueError, base64.binascii.Error) as e:
             # Base64 解码错误
             error_msg = f"Base64解码错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
             
         except UnicodeDecodeError as e:
             # 编码错误
             error_msg = f"编码错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
             
         except Exception as e:
             # 其他未知错误
             error_msg = f"未知错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
         
-        show_progress(i // 3 + 1, total_blocks, "恢复进度:")
+        show_progress(index, total_blocks, "恢复进度:")
     
     # 生成恢复报告
     print()
@@ -1576,17 +2112,59 @@ def get_unique_filepath(filepath):
     name = filepath.stem
     extension = filepath.suffix
     
+    # 读取一次目录列表代替逐个编号stat；按小写比较，兼容不区分大小写的文件系统
+    try:
+        with os.scandir(directory) as it:
+            existing = {entry.name.lower() for entry in it}
+    except OSError:
+        existing = set()
+    
     counter = 1
     while True:
         new_name = f"{name}_{counter}{extension}"
-        new_filepath = directory / new_name
-        if not new_filepath.exists():
-            return str(new_filepath)  # 返回字符串而不是Path对象
+        if new_name.lower() not in existing:
+            new_filepath = directory / new_name
+            # 列出目录后可能有新文件出现，选中的路径再确认一次
+            if not new_filepath.exists():
+                return str(new_filepath)  # 返回字符串而不是Path对象
         counter += 1
 
 
-def backup_existing_file(file_path):
-    """备份已存在的文件，避免覆盖"""
+def _copy_file_fast(src, dst):
+    """
+    复制文件内容并保留修改时间和权限
+    Linux上优先用copy_file_range在内核中复制（btrfs/xfs上可以直接共享数据块），
+    不支持时回退到shutil.copyfile（内部会使用sendfile/fcopyfile或1 MiB缓冲区）
+    """
+    with open(src, 'rb') as fsrc:
+        st = os.fstat(fsrc.fileno())
+        copied = False
+        if hasattr(os, 'copy_file_range') and st.st_size > 0:
+            with open(dst, 'wb') as fdst:
+                try:
+                    remaining = st.st_size
+                    while remaining > 0:
+                        sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30))
+                        if sent == 0:
+                            break
+                        remaining -= sent
+                    copied = remaining == 0
+                except OSError:
+                    # 跨文件系统或文件系统不支持时回退，从头重新复制
+                    copied = False
+    if not copied:
+        shutil.copyfile(src, dst)
+
+    # 只复制时间和权限，不做copy2的完整元数据复制
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+
+
+def backup_existing_file(file_path, notices=None):
+    """
+    备份已存在的文件，避免覆盖
+    notices为列表时不直接打印，把 (消息, 颜色) 追加到列表中，由调用方在主线程统一输出（用于工作线程中调用）
+    """
     if not os.path.exists(file_path):
         return True  # 文件不存在，无需备份
     
@@ -1601,15 +2179,20 @@ def backup_existing_file(file_path):
         backup_path = os.path.join(backup_dir, f"{filename}.backup_{timestamp}")
         
         # 复制文件到备份位置
-        import shutil
-        shutil.copy2(file_path, backup_path)
+        _copy_file_fast(file_path, backup_path)
         
-        print_colored(f"已备份原文件: {file_path} → {backup_path}", 'blue')
-        return True
+        notice = (f"已备份原文件: {file_path} → {backup_path}", 'blue')
+        result = True
         
     except Exception as e:
-        print_colored(f"警告: 备份文件 {file_path} 失败: {str(e)}", 'yellow')
-        return False
+        notice = (f"警告: 备份文件 {file_path} 失败: {str(e)}", 'yellow')
+        result = False
+
+    if notices is None:
+        print_colored(*notice)
+    else:
+        notices.append(notice)
+    return result
 
 
 def verify_snapshot_integrity_fast(snapshot_path, original_path, show_progress_callback=None):
@@ -1630,9 +2213,9 @@ def verify_snapshot_integrity_fast(snapshot_path, original_path, show_progress_c
 
     print_colored("🔍 开始快速验证快照完整性...", 'blue')
 
-    # Windows优化：选择合适的二进制检测函数
-    if platform.system() == 'Windows':
-        binary_check_func = is_binary_file_windows_optimized
+    # Windows优化：选择合适的二进制检测函数；这里的类型只用于估算二进制文件数量，只按扩展名判断，不打开文件
+    if IS_WINDOWS:
+        binary_check_func = partial(is_binary_file_windows_optimized, quick=True)
     else:
         binary_check_func = is_binary_file
 
@@ -1652,30 +2235,23 @@ def verify_snapshot_integrity_fast(snapshot_path, original_path, show_progress_c
         total_original_size = file_size
     else:
         # 文件夹
-        base_path = os.path.normpath(original_path)
-        for root, dirs, files in os.walk(original_path):
-            # 处理文件
-            for file in files:
-                file_path = get_safe_path(os.path.join(root, file))
-                relative_path = os.path.relpath(file_path, start=base_path).replace(os.sep, '/')
-                file_size = os.path.getsize(file_path)
+        # 大小和修改时间来自遍历时的同一次stat
+        for relative_path, file_path, st in _scan_tree(original_path, with_stat=True):
+            if stat.S_ISDIR(st.st_mode):
+                # 处理空目录
                 original_files[relative_path] = {
-                    'size': file_size,
-                    'type': 'binary' if binary_check_func(file_path) else 'text',
-                    'mtime': os.path.getmtime(file_path)
+                    'size': 0,
+                    'type': 'directory',
+                    'mtime': st.st_mtime
                 }
-                total_original_size += file_size
-
-            # 处理空目录
-            for dir_name in dirs:
-                dir_path = get_safe_path(os.path.join(root, dir_name))
-                if not os.listdir(dir_path):
-                    relative_path = os.path.relpath(dir_path, start=base_path).replace(os.sep, '/')
-                    original_files[relative_path] = {
-                        'size': 0,
-                        'type': 'directory',
-                        'mtime': os.path.getmtime(dir_path)
-                    }
+            else:
+                # 处理文件
+                original_files[relative_path] = {
+                    'size': st.st_size,
+                    'type': 'binary' if binary_check_func(file_path, st.st_size) else 'text',
+                    'mtime': st.st_mtime
+                }
+                total_original_size += st.st_size
 
     # 快速解析快照文件（只解析结构，不解码内容）
     snapshot_files = {}
@@ -1686,15 +2262,11 @@ def verify_snapshot_integrity_fast(snapshot_path, original_path, show_progress_c
             if first_line == "COMPRESSED":
                 # 压缩格式 - 只检查是否能成功解压（不完全解压）
                 compressed_content = f.read()
-                if ':' in compressed_content:
-                    method, encoded_data = compressed_content.split(':', 1)
-                else:
-                    method = 'LZMA'
-                    encoded_data = compressed_content
+                method = None
 
                 try:
                     # Windows优化：只进行基本的格式验证，避免实际解压缩
-                    compressed = base64.b85decode(encoded_data.encode('ascii'))
+                    method, compressed = _decode_compressed_payload(compressed_content)
 
                     # 简化的压缩格式验证（不实际解压缩）
                     if method == 'LZMA':
@@ -1722,26 +2294,32 @@ def verify_snapshot_integrity_fast(snapshot_path, original_path, show_progress_c
                                 pass  # 有效的ZLIB格式
                             else:
                                 raise ValueError("不是有效的ZLIB格式")
+                    elif method == 'ZSTD':
+                        # 检查ZSTD帧头: 0x28, 0xB5, 0x2F, 0xFD
+                        if len(compressed) >= 4 and compressed[:4] == b'\x28\xB5\x2F\xFD':
+                            pass  # 有效的ZSTD格式
+                        else:
+                            raise ValueError("不是有效的ZSTD格式")
                     elif method == 'RAW':
                         pass  # RAW格式无需验证
 
-                    # 估算文件数量（基于压缩内容中的@标记数量）
-                    estimated_files = encoded_data.count('@')
                     snapshot_files['_metadata'] = {
                         'format': 'compressed',
                         'method': method,
-                        'estimated_files': estimated_files,
                         'compressed_size': len(compressed)
                     }
+                    # 只有RAW是明文，可以按条目标记估算文件数；其余方法的编码数据中的@与文件数无关，不做估算
+                    if method == 'RAW':
+                        snapshot_files['_metadata']['estimated_files'] = (
+                            compressed.count(b'\n@') + compressed.startswith(b'@'))
 
                 except Exception as e:
                     # 如果压缩验证失败，仍然继续，但标记为可能有问题
                     print_colored(f"⚠️  压缩格式验证警告: {str(e)}", 'yellow')
                     snapshot_files['_metadata'] = {
                         'format': 'compressed',
-                        'method': method,
-                        'estimated_files': encoded_data.count('@'),
-                        'compressed_size': len(base64.b85decode(encoded_data.encode('ascii'))) if encoded_data else 0,
+                        'method': method or '未知',
+                        'compressed_size': len(compressed_content),
                         'validation_warning': str(e)
                     }
 
@@ -1858,6 +2436,8 @@ def display_fast_verification_report(report):
 
         if 'estimated_files' in metadata:
             print_colored(f"📊 估算文件数: {metadata['estimated_files']}", 'blue')
+        elif metadata.get('format') == 'compressed':
+            print_colored("📊 估算文件数: 快速验证不解压压缩数据，未统计", 'blue')
 
         # 显示验证警告（如果有）
         if 'validation_warning' in metadata:
@@ -1884,7 +2464,7 @@ def display_fast_verification_report(report):
         print_colored("⚠️  快速验证发现问题，建议进行完整验证！", 'red')
 
     # Windows性能提示
-    if platform.system() == 'Windows':
+    if IS_WINDOWS:
         print_colored("💡 Windows用户提示: 如验证较慢，建议暂时关闭实时杀毒软件", 'blue')
 
     print_colored("="*60, 'cyan')
@@ -1924,144 +2504,92 @@ def verify_snapshot_integrity(snapshot_path, original_path, show_progress_callba
         total_original_size = file_size
     else:
         # 文件夹
-        base_path = os.path.normpath(original_path)
-        for root, dirs, files in os.walk(original_path):
-            # 处理文件
-            for file in files:
-                file_path = get_safe_path(os.path.join(root, file))
-                relative_path = os.path.relpath(file_path, start=base_path).replace(os.sep, '/')
-                file_size = os.path.getsize(file_path)
-                file_hash = calculate_file_checksum(file_path)
+        for relative_path, file_path, st in _scan_tree(original_path, with_stat=True):
+            if stat.S_ISDIR(st.st_mode):
+                # 处理空目录
                 original_files[relative_path] = {
-                    'size': file_size,
-                    'hash': file_hash,
-                    'type': 'binary' if is_binary_file(file_path) else 'text'
+                    'size': 0,
+                    'hash': None,
+                    'type': 'directory'
                 }
-                total_original_size += file_size
-
-            # 处理空目录
-            for dir_name in dirs:
-                dir_path = get_safe_path(os.path.join(root, dir_name))
-                if not os.listdir(dir_path):
-                    relative_path = os.path.relpath(dir_path, start=base_path).replace(os.sep, '/')
-                    original_files[relative_path] = {
-                        'size': 0,
-                        'hash': None,
-                        'type': 'directory'
-                    }
+            else:
+                # 处理文件
+                original_files[relative_path] = {
+                    'size': st.st_size,
+                    'hash': calculate_file_checksum(file_path),
+                    'type': 'binary' if is_binary_file(file_path, st.st_size) else 'text'
+                }
+                total_original_size += st.st_size
 
     # 解析快照文件内容
     snapshot_files = {}
-    try:
-        with open(snapshot_path, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-
-            if first_line == "COMPRESSED":
-                # 压缩格式
-                compressed_content = f.read()
-                if ':' in compressed_content:
-                    method, encoded_data = compressed_content.split(':', 1)
-                else:
-                    method = 'LZMA'
-                    encoded_data = compressed_content
-
-                compressed = base64.b85decode(encoded_data.encode('ascii'))
-
-                if method == 'LZMA':
-                    decompressed_content = lzma.decompress(compressed).decode('utf-8')
-                elif method == 'BZ2':
-                    import bz2
-                    decompressed_content = bz2.decompress(compressed).decode('utf-8')
-                elif method == 'ZLIB':
-                    import zlib
-                    decompressed_content = zlib.decompress(compressed).decode('utf-8')
-                elif method == 'RAW':
-                    decompressed_content = encoded_data
-                else:
-                    return False, {"error": f"不支持的压缩方法: {method}"}
-
-                content = decompressed_content
-
-            elif first_line == "UNCOMPRESSED":
-                # 未压缩格式
-                content = f.read()
-            else:
-                return False, {"error": "无法识别的快照格式"}
-
-        # 解析文件内容
-        lines = content.split('\n')
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-
-            if (line.startswith('@') and len(line) > 1 and
-                not line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face')) and
-                not line[1:].strip().startswith(('app.route', 'staticmethod', 'classmethod', 'property')) and
-                not 'def ' in line and not 'class ' in line):
-
-                file_path = line[1:]  # 移除@前缀
-
-                # 收集内容
-                content_lines = []
-                i += 1
-                while i < len(lines):
-                    next_line = lines[i]
-                    if (next_line.startswith('@') and len(next_line) > 1 and
-                        not next_line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face'))) or next_line.startswith('!'):
-                        break
-                    content_lines.append(next_line)
-                    i += 1
 
-                # 分析内容类型和大小
-                if content_lines and content_lines[0] == 'B':
-                    # 二进制文件
-                    base64_content = '\n'.join(content_lines[1:])
-                    try:
-                        decoded_content = base64.b64decode(base64_content.encode('ascii'))
-                        snapshot_files[file_path] = {
-                            'size': len(decoded_content),
-                            'hash': hashlib.sha256(decoded_content).hexdigest(),
-                            'type': 'binary',
-                            'status': 'found'
-                        }
-                    except Exception as e:
-                        snapshot_files[file_path] = {
-                            'error': f"Base64解码失败: {str(e)}",
-                            'type': 'binary',
-                            'status': 'error'
-                        }
-                elif content_lines and content_lines[0] == '[EMPTY_DIRECTORY]':
-                    # 空目录
+    def collect_entries(buf, has_header=True):
+        # 与恢复功能共用同一个条目扫描器，按偏移量切片计算大小和哈希，不把快照解码后逐行切分
+        for kind, file_path, start, end in _iter_snapshot_entries(buf, has_header):
+            if kind == 'binary':
+                try:
+                    decoded_content = _b64.b64decode(buf[start:end])
                     snapshot_files[file_path] = {
-                        'size': 0,
-                        'hash': None,
-                        'type': 'directory',
+                        'size': len(decoded_content),
+                        'hash': hashlib.sha256(decoded_content).hexdigest(),
+                        'type': 'binary',
                         'status': 'found'
                     }
-                else:
-                    # 文本文件
-                    if content_lines and content_lines[-1] == '':
-                        content_lines = content_lines[:-1]
-                    text_content = '\n'.join(content_lines)
-                    text_bytes = text_content.encode('utf-8')
+                except Exception as e:
                     snapshot_files[file_path] = {
-                        'size': len(text_bytes),
-                        'hash': hashlib.sha256(text_bytes).hexdigest(),
-                        'type': 'text',
-                        'status': 'found'
+                        'error': f"Base64解码失败: {str(e)}",
+                        'type': 'binary',
+                        'status': 'error'
                     }
-                continue
-            elif line.startswith('!'):
+            elif kind == 'dir':
+                # 空目录
+                snapshot_files[file_path] = {
+                    'size': 0,
+                    'hash': None,
+                    'type': 'directory',
+                    'status': 'found'
+                }
+            elif kind == 'text':
+                text_bytes = buf[start:end]
+                snapshot_files[file_path] = {
+                    'size': len(text_bytes),
+                    'hash': hashlib.sha256(text_bytes).hexdigest(),
+                    'type': 'text',
+                    'status': 'found'
+                }
+            else:
                 # 错误文件
-                file_path = line[1:]
-                error_content = lines[i+1] if i+1 < len(lines) else ""
                 snapshot_files[file_path] = {
-                    'error': error_content,
+                    'error': buf[start:end].decode('utf-8', errors='replace'),
                     'status': 'error'
                 }
-                i += 2
-                continue
-            i += 1
+
+    try:
+        with open(snapshot_path, 'rb') as f:
+            first_line = f.readline().strip()
+
+            if first_line == b"COMPRESSED":
+                # 压缩格式
+                compressed_content = f.read().decode('utf-8')
+                method, compressed = _decode_compressed_payload(compressed_content)
+
+                if method == 'RAW':
+                    decompressed_content = compressed
+                elif method in ('LZMA', 'BZ2', 'ZLIB', 'LZMA_EXTREME', 'ZLIB_ULTRA', 'BZ2_MAX', 'ZSTD'):
+                    decompressed_content = _decompress_by_method(method, compressed)
+                else:
+                    return False, {"error": f"不支持的压缩方法: {method}"}
+
+                # 解压后的内容没有格式标识行（重组后的内容直接以@开头）
+                collect_entries(decompressed_content, has_header=False)
+
+            elif first_line == b"UNCOMPRESSED":
+                # 未压缩格式：内存映射整个快照
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    collect_entries(mm)
+            else:
+                return False, {"error": "无法识别的快照格式"}
 
     except Exception as e:
         return False, {"error": f"解析快照文件时出错: {str(e)}"}
@@ -2195,6 +2723,10 @@ def display_verification_report(report):
     print_colored("="*60, 'cyan')
 
 
+# 验证压缩快照时读取的开头字符数
+_VALIDATE_PREFIX_SIZE = 4096
+
+
 def validate_snapshot_file(file_path):
     """验证快照文件的完整性和有效性"""
     if not os.path.isfile(file_path):
@@ -2205,37 +2737,34 @@ def validate_snapshot_file(file_path):
             first_line = f.readline().strip()
             
             if first_line == "COMPRESSED":
-                # 压缩格式验证
-                compressed_content = f.read()
+                # 压缩格式验证：只读取开头一段检查方法标记和编码格式，是结构检查而非完整校验
+                # （完整性由校验和验证负责），大快照无需读入和解码全部数据
+                compressed_content = f.read(_VALIDATE_PREFIX_SIZE)
                 if ':' in compressed_content:
-                    method, encoded_data = compressed_content.split(':', 1)
-                    if method not in ['LZMA', 'BZ2', 'ZLIB', 'RAW']:
+                    method = compressed_content[:compressed_content.index(':')]
+                    is_base64 = method.endswith(_BASE64_TAG_SUFFIX)
+                    if is_base64:
+                        method = method[:-len(_BASE64_TAG_SUFFIX)]
+                    if method not in ['LZMA', 'BZ2', 'ZLIB', 'ZSTD', 'RAW', 'LZMA_EXTREME', 'ZLIB_ULTRA', 'BZ2_MAX']:
                         return False, f"不支持的压缩方法: {method}"
                     
-                    # 验证base85编码
-                    try:
-                        base64.b85decode(encoded_data.encode('ascii'))
-                    except (ValueError, base64.binascii.Error):
-                        return False, "Base85编码格式错误"
+                    # 验证base64/base85编码：只检查字符是否都在编码字符表中，不实际解码
+                    if method != 'RAW':
+                        encoded_data = compressed_content[compressed_content.index(':') + 1:].rstrip()
+                        alphabet = _BASE64_ALPHABET if is_base64 else _BASE85_ALPHABET
+                        if not encoded_data.isascii() or encoded_data.encode('ascii').translate(None, alphabet):
+                            return False, "压缩数据编码格式错误"
                 
                 return True, "压缩格式验证通过"
                 
             else:
-                # 普通文本格式验证
-                content = first_line + f.read()
-                lines = content.split('\n')
-                
-                # 检查是否有有效的文件标记
-                file_markers = [line for line in lines if 
-                               line.startswith('@') and len(line) > 1 and 
-                               not line[1:].strip().startswith(('keyframes', 'media', 'import', 'charset', 'font-face')) and
-                               not line[1:].strip().startswith(('app.route', 'staticmethod', 'classmethod', 'property')) and
-                               not 'def ' in line and not 'class ' in line]
-                
-                if not file_markers:
-                    return False, "未找到有效的文件标记"
-                
-                return True, "文本格式验证通过"
+                # 普通文本格式验证：逐行读取，找到第一个有效的文件标记即可返回，不把整个快照读入内存
+                for line in itertools.chain((first_line,), f):
+                    line = line.rstrip('\n')
+                    if line.startswith('@') and len(line) > 1 and not _NON_ENTRY_AT_LINE_STR.match(line):
+                        return True, "文本格式验证通过"
+
+                return False, "未找到有效的文件标记"
                 
     except UnicodeDecodeError:
         return False, "文件编码错误，不是有效的UTF-8文本文件"
@@ -2243,36 +2772,39 @@ def validate_snapshot_file(file_path):
         return False, f"验证过程中发生错误: {str(e)}"
 
 
+# 终端颜色表只在导入时构建一次；Windows下需要colorama，未安装时不输出颜色
+if IS_WINDOWS:
+    try:
+        import colorama
+        colorama.init(autoreset=True)  # 自动重置颜色
+        _COLORS = {
+            'red': colorama.Fore.RED,
+            'green': colorama.Fore.GREEN,
+            'yellow': colorama.Fore.YELLOW,
+            'blue': colorama.Fore.BLUE,
+            'magenta': colorama.Fore.MAGENTA,
+            'cyan': colorama.Fore.CYAN,
+            'end': colorama.Style.RESET_ALL
+        }
+    except ImportError:
+        _COLORS = {}  # 没有安装colorama则使用普通文本
+else:
+    _COLORS = {
+        'red': '\033[91m',
+        'green': '\033[92m',
+        'yellow': '\033[93m',
+        'blue': '\033[94m',
+        'magenta': '\033[95m',
+        'cyan': '\033[96m',
+        'end': '\033[0m'
+    }
+_COLOR_END = _COLORS.get('end', '')
+
+
 def print_colored(text, color):
     """跨平台彩色打印文本，增强错误处理"""
     try:
-        if platform.system() == 'Windows':
-            try:
-                import colorama
-                colorama.init(autoreset=True)  # 自动重置颜色
-                colors = {
-                    'red': colorama.Fore.RED,
-                    'green': colorama.Fore.GREEN,
-                    'yellow': colorama.Fore.YELLOW,
-                    'blue': colorama.Fore.BLUE,
-                    'magenta': colorama.Fore.MAGENTA,
-                    'cyan': colorama.Fore.CYAN,
-                    'end': colorama.Style.RESET_ALL
-                }
-                print(f"{colors.get(color, '')}{text}{colors['end']}")
-            except ImportError:
-                print(text)  # 没有安装colorama则使用普通文本
-        else:
-            colors = {
-                'red': '\033[91m',
-                'green': '\033[92m',
-                'yellow': '\033[93m',
-                'blue': '\033[94m',
-                'magenta': '\033[95m',
-                'cyan': '\033[96m',
-                'end': '\033[0m'
-            }
-            print(f"{colors.get(color, '')}{text}{colors['end']}")
+        print(f"{_COLORS.get(color, '')}{text}{_COLOR_END}")
     except Exception:
         # 如果彩色打印失败，回退到普通打印
         print(text)
@@ -2283,32 +2815,45 @@ def get_safe_path(path):
     # 使用 Path 对象确保跨平台兼容性，然后转换为字符串
     return str(Path(path).resolve())
 
+# 连续下划线，清理文件名时合并为一个
+_MULTI_UNDERSCORE = re.compile(r'_+')
+
+
+@lru_cache(maxsize=None)
+def _sanitize_rules():
+    """
+    返回清理文件名和路径所需的 (无效字符替换表, 保留名称集合, 文件名长度上限, 路径长度上限)
+    平台信息在进程内不变，只在第一次调用时构建
+    """
+    platform_info = get_platform_info()
+    # 根据平台构建无效字符替换表，str.translate在C层面单次遍历完成替换
+    invalid_chars = str.maketrans(dict.fromkeys(platform_info['invalid_chars'], '_'))
+    reserved_names = frozenset(platform_info['reserved_names'])
+    # 使用平台限制和安全限制的较小值
+    max_length = min(platform_info['max_filename_length'], 200)
+    return invalid_chars, reserved_names, max_length, platform_info['max_path_length']
+
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(filename):
     """清理文件名，移除当前平台不支持的字符，确保跨平台兼容性"""
-    import re
-    
-    # 获取平台信息
-    platform_info = get_platform_info()
-    
-    # 根据平台构建无效字符正则表达式
-    invalid_chars_str = platform_info['invalid_chars']
-    # 转义正则表达式特殊字符
-    escaped_chars = re.escape(invalid_chars_str)
-    invalid_chars_pattern = f'[{escaped_chars}]'
+    # 结果只取决于文件名本身；同一快照中大量路径共享相同的目录名，按名称缓存
+    invalid_chars, reserved_names, max_length, _ = _sanitize_rules()
     
     # 替换不合法字符为下划线
-    sanitized = re.sub(invalid_chars_pattern, '_', filename)
+    sanitized = filename.translate(invalid_chars)
     
-    # 处理连续的下划线，替换为单个下划线
-    sanitized = re.sub(r'_+', '_', sanitized)
+    # 处理连续的下划线，替换为单个下划线（没有连续下划线时跳过正则）
+    if '__' in sanitized:
+        sanitized = _MULTI_UNDERSCORE.sub('_', sanitized)
     
     # 移除开头和结尾的空格和点（Windows要求）
     sanitized = sanitized.strip(' .')
     
     # 检查是否为保留名称（主要针对Windows）
-    if platform_info['reserved_names']:
+    if reserved_names:
         name_without_ext = os.path.splitext(sanitized)[0].upper()
-        if name_without_ext in platform_info['reserved_names']:
+        if name_without_ext in reserved_names:
             sanitized = f"_{sanitized}"
     
     # 确保文件名不为空
@@ -2316,7 +2861,6 @@ def sanitize_filename(filename):
         sanitized = "unnamed_file"
     
     # 限制文件名长度
-    max_length = min(platform_info['max_filename_length'], 200)  # 使用平台限制和安全限制的较小值
     if len(sanitized) > max_length:
         name, ext = os.path.splitext(sanitized)
         # 确保截断后仍然有空间给扩展名
@@ -2417,26 +2961,26 @@ def diagnose_platform_compatibility():
 def normalize_path_for_restore(stored_path):
     """将快照中存储的路径规范化为当前系统的路径格式"""
     # 将存储的Unix风格路径转换为当前系统路径
-    # 使用 Path 对象确保跨平台兼容性
-    path_obj = Path(stored_path.replace('/', os.sep))
-    return str(path_obj)
+    # 直接做字符串替换，避免为每个条目构造 Path 对象
+    return stored_path.replace('/', os.sep)
 
 def sanitize_file_path(file_path):
     """清理文件路径，处理Windows不支持的字符，确保跨平台兼容性"""
-    # 获取平台信息
-    platform_info = get_platform_info()
+    # 平台的路径长度上限与文件名规则一起缓存，不为每个路径重新获取平台信息
+    max_path_length = _sanitize_rules()[3]
     
     # 首先规范化路径格式
     normalized_path = normalize_path_for_restore(file_path)
     
-    # 使用 Path 对象分割路径，更可靠
-    path_obj = Path(normalized_path)
-    path_parts = path_obj.parts
+    # 按系统分隔符分割路径（Windows下同时识别 / 和 \）
+    if os.altsep:
+        normalized_path = normalized_path.replace(os.altsep, os.sep)
+    path_parts = normalized_path.split(os.sep)
     
     # 清理每个路径部分
     sanitized_parts = []
     for part in path_parts:
-        if part and part not in ('.', '..', '/'):  # 跳过空字符串、相对路径标记和根目录
+        if part and part not in ('.', '..'):  # 跳过空字符串（根目录、重复分隔符）和相对路径标记
             sanitized_part = sanitize_filename(part)
             sanitized_parts.append(sanitized_part)
     
@@ -2444,15 +2988,15 @@ def sanitize_file_path(file_path):
     result_path = os.sep.join(sanitized_parts)
     
     # 检查路径长度是否超过平台限制
-    if len(result_path) > platform_info['max_path_length']:
+    if len(result_path) > max_path_length:
         print_colored(f"警告: 路径长度超过平台限制，将被截断: {result_path[:50]}...", 'yellow')
         # 简单截断策略，保留文件扩展名
         if '.' in result_path:
             name, ext = os.path.splitext(result_path)
-            max_name_length = platform_info['max_path_length'] - len(ext) - 10  # 留一些缓冲
+            max_name_length = max_path_length - len(ext) - 10  # 留一些缓冲
             result_path = name[:max_name_length] + ext
         else:
-            result_path = result_path[:platform_info['max_path_length'] - 10]
+            result_path = result_path[:max_path_length - 10]
     
     return result_path
 
@@ -2468,9 +3012,12 @@ def validate_path(path):
 def calculate_file_checksum(file_path, algorithm='sha256'):
     """计算文件的校验和"""
     try:
-        hash_func = hashlib.new(algorithm)
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+        with open(file_path, 'rb', buffering=0) as f:
+            # Python 3.11+ 由hashlib.file_digest在C层循环读取并更新摘要
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, algorithm).hexdigest()
+            hash_func = hashlib.new(algorithm)
+            for chunk in iter(lambda: f.read(1 << 20), b""):
                 hash_func.update(chunk)
         return hash_func.hexdigest()
     except Exception as e:
@@ -2483,8 +3030,12 @@ def verify_file_integrity(original_path, restored_path):
     if not os.path.exists(restored_path):
         return False, "恢复文件不存在"
     
-    original_checksum = calculate_file_checksum(original_path)
-    restored_checksum = calculate_file_checksum(restored_path)
+    # 两个文件的校验和并行计算，磁盘读取相互重叠
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        original_future = executor.submit(calculate_file_checksum, original_path)
+        restored_future = executor.submit(calculate_file_checksum, restored_path)
+        original_checksum = original_future.result()
+        restored_checksum = restored_future.result()
     
     if original_checksum is None or restored_checksum is None:
         return False, "无法计算校验和"
@@ -2495,15 +3046,30 @@ def verify_file_integrity(original_path, restored_path):
         return False, f"校验和不匹配: 原始={original_checksum[:8]}, 恢复={restored_checksum[:8]}"
 
 
+# 进度条两次刷新之间的最小间隔（秒），文件很多时避免进度输出成为瓶颈
+PROGRESS_MIN_INTERVAL = 1 / 30
+_last_progress_time = 0.0
+_last_progress_percent = -1
+
+
 def show_progress(current, total, prefix=""):
-    """显示进度条"""
+    """显示进度条，刷新频率限制在约30次/秒且百分比变化时才重绘，开始和完成时总会刷新"""
+    global _last_progress_time, _last_progress_percent
+    now = time.monotonic()
+    in_progress = 0 < current < total
+    if in_progress and now - _last_progress_time < PROGRESS_MIN_INTERVAL:
+        return
     percent = int(current * 100 / total) if total > 0 else 0
+    if in_progress and percent == _last_progress_percent:
+        return
+    _last_progress_time = now
+    _last_progress_percent = percent
+
     bar_length = 50
     filled_length = int(bar_length * current // total) if total > 0 else 0
     bar = '#' * filled_length + '-' * (bar_length - filled_length)
-    print(f"\r{prefix} [{bar}] {percent}%", end='')
-    if current == total:
-        print()
+    sys.stdout.write(f"\r{prefix} [{bar}] {percent}%" + ("\n" if current == total else ""))
+    sys.stdout.flush()
 
 
 def parse_arguments():
@@ -2635,7 +3201,6 @@ def run_interactive_mode():
                 temp_output_file = gather_files_to_txt(path, show_progress_callback=progress_callback)
                 
                 # 移动到指定路径
-                import shutil
                 shutil.move(str(temp_output_file), output_path)
                 
                 print() # 换行
@@ -2659,7 +3224,6 @@ def run_interactive_mode():
                 temp_output_file = gather_files_to_txt_compressed(path, show_progress_callback=progress_callback)
                 
                 # 移动到指定路径
-                import shutil
                 shutil.move(str(temp_output_file), output_path)
                 
                 print() # 换行
@@ -2724,7 +3288,6 @@ def run_interactive_mode():
 
         except Exception as e:
             print_colored(f"\n❌ 发生严重错误: {str(e)}", 'red')
-            import traceback
             if input("是否显示详细错误信息? (y/N): ").strip().lower() == 'y':
                 traceback.print_exc()
             continue
@@ -2732,10 +3295,8 @@ def run_interactive_mode():
 
 def generate_default_output_path(input_path, operation_type):
     """生成默认输出路径"""
-    from datetime import datetime
-    
     input_path = Path(input_path)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     
     if input_path.is_file():
         # 单个文件
@@ -2779,7 +3340,6 @@ def run_command_line_mode(args):
             
             # 处理输出路径
             if args.output:
-                import shutil
                 final_output = get_safe_path(args.output)
                 
                 # 如果输出路径是目录，生成文件名
@@ -2802,7 +3362,6 @@ def run_command_line_mode(args):
                 default_output = generate_default_output_path(args.input, args.type)
                 default_output = get_unique_filepath(default_output)
                 
-                import shutil
                 shutil.move(str(output_file), default_output)
                 output_file = default_output
             
@@ -2844,24 +3403,28 @@ def create_restore_report(success_count, error_count, error_details, output_fold
     report_path = os.path.join(output_folder, "restore_report.txt")
     
     try:
+        # 先拼好全部内容再一次写入，错误很多时不必逐行经过编码和缓冲层
+        parts = [
+            "=== 文件夹快照恢复报告 ===\n\n",
+            f"恢复时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"目标目录: {output_folder}\n",
+            f"成功文件: {success_count}\n",
+            f"失败文件: {error_count}\n",
+            f"成功率: {(success_count/(success_count + error_count)*100):.2f}%\n\n",
+        ]
+        
+        if error_count > 0:
+            parts.append("=== 错误详情 ===\n")
+            parts.extend(f"{i}. {error}\n" for i, error in enumerate(error_details, 1))
+        
+        parts.append("\n=== 恢复摘要 ===\n")
+        if error_count == 0:
+            parts.append("✅ 所有文件恢复成功！")
+        else:
+            parts.append(f"⚠️  {error_count} 个文件恢复失败，请检查错误详情。")
+        
         with open(report_path, 'w', encoding='utf-8') as report_file:
-            report_file.write("=== 文件夹快照恢复报告 ===\n\n")
-            report_file.write(f"恢复时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            report_file.write(f"目标目录: {output_folder}\n")
-            report_file.write(f"成功文件: {success_count}\n")
-            report_file.write(f"失败文件: {error_count}\n")
-            report_file.write(f"成功率: {(success_count/(success_count + error_count)*100):.2f}%\n\n")
-            
-            if error_count > 0:
-                report_file.write("=== 错误详情 ===\n")
-                for i, error in enumerate(error_details, 1):
-                    report_file.write(f"{i}. {error}\n")
-            
-            report_file.write("\n=== 恢复摘要 ===\n")
-            if error_count == 0:
-                report_file.write("✅ 所有文件恢复成功！")
-            else:
-                report_file.write(f"⚠️  {error_count} 个文件恢复失败，请检查错误详情。")
+            report_file.write(''.join(parts))
         
         print_colored(f"恢复报告已保存到: {report_path}", 'blue')
         return True
@@ -2870,6 +3433,40 @@ def create_restore_report(success_count, error_count, error_details, output_fold
         print_colored(f"警告: 创建恢复报告失败: {str(e)}", 'yellow')
         return False
 
+def _iter_old_format_blocks(content):
+    """
+    扫描旧版本快照内容，按顺序产出 (路径, 文件内容)
+    与按 '=== 文件: 路径 ===\n' 做re.split、再取每块分隔线之前部分的结果相同，
+    但只用find在文件头之间跳转，不生成分割后的中间列表
+    """
+    find = content.find  # 循环内频繁调用，绑定为局部变量
+    header_prefix = '=== 文件: '
+    footer = '\n' + "=" * 50
+
+    def next_header(pos):
+        # 返回 (头部起始, 路径起始, 路径结束)；路径至少一个字符且不跨行，找不到时返回None
+        while True:
+            start = find(header_prefix, pos)
+            if start == -1:
+                return None
+            path_start = start + len(header_prefix)
+            path_end = find(' ===\n', path_start + 1)
+            if path_end != -1 and find('\n', path_start, path_end) == -1:
+                return start, path_start, path_end
+            pos = start + 1
+
+    header = next_header(0)
+    while header is not None:
+        _, path_start, path_end = header
+        body_start = path_end + len(' ===\n')
+        header = next_header(body_start)
+        body_end = header[0] if header is not None else len(content)
+        footer_pos = find(footer, body_start, body_end)
+        if footer_pos != -1:
+            body_end = footer_pos
+        yield content[path_start:path_end], content[body_start:body_end]
+
+
 def restore_files_from_old_txt(txt_path, output_folder):
     """从旧版本未压缩的文本文件恢复原始文件"""
     if not os.path.isfile(txt_path):
@@ -2882,11 +3479,10 @@ def restore_files_from_old_txt(txt_path, output_folder):
     
     os.makedirs(output_folder, exist_ok=True)
     
-    # 使用正则表达式分割文件块
-    import re
-    file_blocks = re.split(r'=== 文件: (.+?) ===\n', content)[1:]
+    # 单次扫描切分文件块
+    file_blocks = list(_iter_old_format_blocks(content))
     
-    total_blocks = len(file_blocks) // 2
+    total_blocks = len(file_blocks)
     if total_blocks == 0:
         print_colored("警告: 未在文件中找到任何有效的文件块。", 'yellow')
         return
@@ -2899,27 +3495,32 @@ def restore_files_from_old_txt(txt_path, output_folder):
     error_count = 0
     error_details = []
     
-    for i in range(0, len(file_blocks), 2):
-        if i + 1 >= len(file_blocks):
-            break
-            
-        file_path = file_blocks[i].strip().replace('\\', '/')
-        file_content = file_blocks[i+1].split('\n' + "="*50)[0]
-        
-        # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
-        sanitized_file_path = sanitize_file_path(file_path)
-        # 使用 Path 对象确保正确的路径连接
-        full_path = str(Path(output_folder) / sanitized_file_path)
-        
+    # 已确认存在的目录，避免对同一父目录反复调用makedirs
+    ensured_dirs = {output_folder}
+    
+    def restore_block(block):
+        # 在工作线程中写出单个文件块，异常由主线程按类型记录
+        sanitized_file_path, file_content = block
+        full_path = os.path.join(output_folder, sanitized_file_path)
+
+        # 确保父目录存在
+        _ensure_directory(os.path.dirname(full_path), ensured_dirs)
+
+        # 写入文件内容
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(file_content)
+
+    # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
+    blocks = [(sanitize_file_path(file_path.strip().replace('\\', '/')), file_content)
+              for file_path, file_content in file_blocks]
+
+    # 写入交给线程池并行完成，结果按原顺序统计；有重复路径时保持串行，保证后出现的文件块覆盖先出现的
+    has_duplicates = _has_duplicate_paths(block[0] for block in blocks)
+    restored = _prefetch_ordered(restore_block, blocks, max_workers=1 if has_duplicates else None)
+
+    for index, ((sanitized_file_path, _), future) in enumerate(restored, 1):
         try:
-            # 确保父目录存在
-            parent_dir = os.path.dirname(full_path)
-            if parent_dir:  # 只有当父目录不为空时才创建
-                os.makedirs(parent_dir, exist_ok=True)
-            
-            # 写入文件内容
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            future.result()
             success_count += 1
             
         except OSError as e:
@@ -2929,18 +3530,16 @@ def restore_files_from_old_txt(txt_path, output_folder):
                 error_msg += " (权限被拒绝，请检查文件权限或以管理员身份运行)"
             elif e.errno == 28:  # No space left on device
                 error_msg += " (磁盘空间不足，请清理磁盘空间)"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
             
         except Exception as e:
             # 其他未知错误
             error_msg = f"未知错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
         
-        show_progress(i // 2 + 1, total_blocks, "恢复进度:")
+        show_progress(index, total_blocks, "恢复进度:")
     
     # 生成恢复报告
     print()
@@ -2959,6 +3558,10 @@ def restore_files_from_old_txt(txt_path, output_folder):
     
     print_colored(f"文件已从 {txt_path} 恢复到 {output_folder}", 'green')
 
+# 旧版本压缩快照每次读取的base85字符数，必须是5的倍数
+_OLD_B85_READ_SIZE = 5 << 18
+
+
 def restore_files_from_old_compressed_txt(txt_path, output_folder):
     """从旧版本压缩的文本文件恢复原始文件"""
     if not os.path.isfile(txt_path):
@@ -2967,22 +3570,35 @@ def restore_files_from_old_compressed_txt(txt_path, output_folder):
 
     # 读取压缩内容
     print("正在读取并解压缩文件...")
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        first_line = f.readline().strip()
-        if first_line != "=== SNAPSHOT_FORMAT: COMPRESSED ===":
-            print_colored("错误: 文件格式不正确!", 'red')
-            return
-        f.readline()  # 跳过空行
-        compressed_content = f.read()
-    
     try:
-        # 解压内容
-        compressed = base64.b85decode(compressed_content.encode('utf-8'))
-        decompressed_content = lzma.decompress(compressed).decode('utf-8')
+        # 分块解码base85并流式解压，不在内存中同时保留完整的压缩文本、解码结果和解压结果
+        decompressor = lzma.LZMADecompressor()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        original_size = 0
+        with open(txt_path, 'rb') as f:
+            first_line = f.readline().strip()
+            if first_line != "=== SNAPSHOT_FORMAT: COMPRESSED ===".encode('utf-8'):
+                print_colored("错误: 文件格式不正确!", 'red')
+                return
+            f.readline()  # 跳过空行
+            data_start = f.tell()
+            while True:
+                # 读取长度是5的倍数，除最后一块外每块都是完整的base85分组
+                chunk = f.read(_OLD_B85_READ_SIZE)
+                if not chunk:
+                    break
+                out = decompressor.decompress(base64.b85decode(chunk))
+                original_size += len(out)
+                parts.append(decoder.decode(out))
+            compressed_size = f.tell() - data_start
+        if not decompressor.eof:
+            raise lzma.LZMAError("压缩数据在结束标记之前中断")
+        parts.append(decoder.decode(b'', final=True))
+        decompressed_content = ''.join(parts)
+        del parts
         
         # 显示解压比例
-        compressed_size = len(compressed_content.encode('utf-8'))
-        original_size = len(decompressed_content.encode('utf-8'))
         if compressed_size > 0:
             ratio = (original_size / compressed_size) * 100
             print_colored(f"解压比例: 压缩文件 {compressed_size/1024:.2f} KB → 解压后 {original_size/1024:.2f} KB (原始大小的 {ratio:.2f}%)", 'blue')
@@ -2994,11 +3610,10 @@ def restore_files_from_old_compressed_txt(txt_path, output_folder):
     # 恢复文件内容
     os.makedirs(output_folder, exist_ok=True)
     
-    # 使用正则表达式分割文件块
-    import re
-    file_blocks = re.split(r'=== 文件: (.+?) ===\n', decompressed_content)[1:]
+    # 单次扫描切分文件块
+    file_blocks = list(_iter_old_format_blocks(decompressed_content))
     
-    total_blocks = len(file_blocks) // 2
+    total_blocks = len(file_blocks)
     if total_blocks == 0:
         print_colored("警告: 未在文件中找到任何有效的文件块。", 'yellow')
         return
@@ -3011,27 +3626,32 @@ def restore_files_from_old_compressed_txt(txt_path, output_folder):
     error_count = 0
     error_details = []
     
-    for i in range(0, len(file_blocks), 2):
-        if i + 1 >= len(file_blocks):
-            break
-            
-        file_path = file_blocks[i].strip().replace('\\', '/')
-        file_content = file_blocks[i+1].split('\n' + "="*50)[0]
-        
-        # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
-        sanitized_file_path = sanitize_file_path(file_path)
-        # 使用 Path 对象确保正确的路径连接
-        full_path = str(Path(output_folder) / sanitized_file_path)
-        
+    # 已确认存在的目录，避免对同一父目录反复调用makedirs
+    ensured_dirs = {output_folder}
+    
+    def restore_block(block):
+        # 在工作线程中写出单个文件块，异常由主线程按类型记录
+        sanitized_file_path, file_content = block
+        full_path = os.path.join(output_folder, sanitized_file_path)
+
+        # 确保父目录存在
+        _ensure_directory(os.path.dirname(full_path), ensured_dirs)
+
+        # 写入文件内容
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(file_content)
+
+    # 清理文件路径，处理Windows不支持的字符，确保跨平台兼容性
+    blocks = [(sanitize_file_path(file_path.strip().replace('\\', '/')), file_content)
+              for file_path, file_content in file_blocks]
+
+    # 写入交给线程池并行完成，结果按原顺序统计；有重复路径时保持串行，保证后出现的文件块覆盖先出现的
+    has_duplicates = _has_duplicate_paths(block[0] for block in blocks)
+    restored = _prefetch_ordered(restore_block, blocks, max_workers=1 if has_duplicates else None)
+
+    for index, ((sanitized_file_path, _), future) in enumerate(restored, 1):
         try:
-            # 确保父目录存在
-            parent_dir = os.path.dirname(full_path)
-            if parent_dir:  # 只有当父目录不为空时才创建
-                os.makedirs(parent_dir, exist_ok=True)
-            
-            # 写入文件内容
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            future.result()
             success_count += 1
             
         except OSError as e:
@@ -3041,18 +3661,16 @@ def restore_files_from_old_compressed_txt(txt_path, output_folder):
                 error_msg += " (权限被拒绝，请检查文件权限或以管理员身份运行)"
             elif e.errno == 28:  # No space left on device
                 error_msg += " (磁盘空间不足，请清理磁盘空间)"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
             
         except Exception as e:
             # 其他未知错误
             error_msg = f"未知错误: {sanitized_file_path} - {str(e)}"
-            print_colored(f"警告: {error_msg}", 'yellow')
             error_count += 1
             error_details.append(error_msg)
         
-        show_progress(i // 2 + 1, total_blocks, "恢复进度:")
+        show_progress(index, total_blocks, "恢复进度:")
     
     # 生成恢复报告
     print()
@@ -3075,7 +3693,7 @@ def restore_files_from_old_compressed_txt(txt_path, output_folder):
 # 主函数
 if __name__ == "__main__":
     # 检查并尝试安装colorama (仅Windows)
-    if platform.system() == 'Windows':
+    if IS_WINDOWS:
         try:
             import colorama
         except ImportError:
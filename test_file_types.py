@@ -7,6 +7,11 @@
 
 import os
 import sys
+import lzma
+import random
+import re
+import zlib
+import base64
 import tempfile
 import shutil
 from pathlib import Path
@@ -15,13 +20,24 @@ from pathlib import Path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
+    import FolderSnapshot
     from FolderSnapshot import (
         gather_files_to_txt,
         gather_files_to_txt_compressed,
         is_binary_file,
         verify_snapshot_integrity,
         display_verification_report,
-        print_colored
+        print_colored,
+        restore_files_from_txt,
+        restore_files_from_compressed_txt,
+        _encode_compressed_payload,
+        _decode_compressed_payload,
+        _decompress_by_method,
+        _ZLIB_DICTIONARY,
+        _iter_snapshot_entries,
+        _scan_tree,
+        _iter_old_format_blocks,
+        zstandard
     )
 except ImportError as e:
     print(f"无法导入FolderSnapshot模块: {e}")
@@ -168,6 +184,385 @@ def test_snapshot_creation_and_verification(test_dir):
         print_colored(f"❌ 压缩快照创建失败: {e}", 'red')
 
 
+def test_compressed_format_compatibility(temp_dir):
+    """测试各种压缩方法标记的快照都能正确恢复（旧版本base85格式和当前的base64格式）"""
+    print_colored("\n=== 测试压缩格式兼容性 ===", 'blue')
+
+    binary_content = bytes(range(256)) * 4
+    expected = {
+        'a.txt': 'hello\n中文\n'.encode('utf-8'),
+        'sub/b.bin': binary_content,
+    }
+    snapshot_text = ('\n@a.txt\nhello\n中文\n\n'
+                     f'\n@sub/b.bin\nB\n{base64.b64encode(binary_content).decode("ascii")}\n\n')
+    data = snapshot_text.encode('utf-8')
+
+    # 旧版本的ZLIB_ULTRA：先把字典当作数据送入压缩器并丢弃这部分输出，结果使用base85编码
+    legacy_compressor = zlib.compressobj(level=9, wbits=15, memLevel=9, strategy=zlib.Z_DEFAULT_STRATEGY)
+    legacy_compressor.compress(_ZLIB_DICTIONARY)
+    legacy_zlib_ultra = legacy_compressor.compress(data) + legacy_compressor.flush()
+
+    payloads = [
+        ('ZLIB_ULTRA (旧版base85)', f"ZLIB_ULTRA:{base64.b85encode(legacy_zlib_ultra).decode('ascii')}"),
+        ('LZMA (旧版base85)', f"LZMA:{base64.b85encode(lzma.compress(data)).decode('ascii')}"),
+        ('LZMA64', _encode_compressed_payload('LZMA', lzma.compress(data, format=lzma.FORMAT_XZ))),
+    ]
+    if zstandard is not None:
+        payloads.append(('ZSTD64', _encode_compressed_payload('ZSTD', zstandard.ZstdCompressor().compress(data))))
+    else:
+        print_colored("⚠️  未安装zstandard，跳过ZSTD64格式测试", 'yellow')
+
+    for index, (name, payload) in enumerate(payloads):
+        snapshot_path = os.path.join(temp_dir, f'compat_{index}.txt')
+        output_dir = os.path.join(temp_dir, f'compat_out_{index}')
+        with open(snapshot_path, 'w', encoding='utf-8') as f:
+            f.write("COMPRESSED\n" + payload)
+
+        try:
+            # 解压结果必须与原始快照内容完全一致
+            method, compressed = _decode_compressed_payload(payload)
+            if _decompress_by_method(method, compressed) != data:
+                print_colored(f"❌ {name} 格式解压结果与原始内容不一致", 'red')
+                continue
+
+            restore_files_from_txt(snapshot_path, output_dir)
+            mismatched = []
+            for relative_path, content in expected.items():
+                restored_path = os.path.join(output_dir, relative_path)
+                if not os.path.isfile(restored_path):
+                    mismatched.append(relative_path)
+                    continue
+                with open(restored_path, 'rb') as f:
+                    if f.read() != content:
+                        mismatched.append(relative_path)
+            if mismatched:
+                print_colored(f"❌ {name} 格式恢复结果不一致: {mismatched}", 'red')
+            else:
+                print_colored(f"✅ {name} 格式恢复成功", 'green')
+        except Exception as e:
+            print_colored(f"❌ {name} 格式恢复失败: {e}", 'red')
+
+
+def test_large_non_utf8_text_round_trip(temp_dir):
+    """测试大文本文件不是合法UTF-8时，压缩与无压缩快照都按整个文件做编码回退，恢复结果一致"""
+    print_colored("\n=== 测试大文件编码回退 ===", 'blue')
+
+    source_dir = os.path.join(temp_dir, 'large_non_utf8')
+    os.makedirs(source_dir, exist_ok=True)
+    contents = {
+        # 非法字节出现在大量多字节UTF-8内容之后
+        'cjk.xyz': '中文'.encode('utf-8') * 300000 + b'\xe9tail\n',
+        # 非法字节出现在纯ASCII开头之后
+        'ascii.xyz': b'a' * 3000000 + b'\xe9x\n',
+    }
+    for name, content in contents.items():
+        with open(os.path.join(source_dir, name), 'wb') as f:
+            f.write(content)
+
+    # 调低预读上限，让测试文件走大文件的分块处理分支
+    original_prefetch_size = FolderSnapshot.PREFETCH_MAX_FILE_SIZE
+    FolderSnapshot.PREFETCH_MAX_FILE_SIZE = 0
+    try:
+        snapshots = [
+            ('无压缩', gather_files_to_txt(source_dir), restore_files_from_txt),
+            ('压缩', gather_files_to_txt_compressed(source_dir), restore_files_from_compressed_txt),
+        ]
+    finally:
+        FolderSnapshot.PREFETCH_MAX_FILE_SIZE = original_prefetch_size
+
+    encodings = ['cp1252', 'utf-16', 'latin1'] if FolderSnapshot.IS_WINDOWS else ['latin1']
+    for label, snapshot_path, restore_func in snapshots:
+        output_dir = os.path.join(temp_dir, f'large_non_utf8_out_{label}')
+        try:
+            restore_func(str(snapshot_path), output_dir)
+            mismatched = []
+            for name, content in contents.items():
+                for encoding in encodings:
+                    try:
+                        expected = content.decode(encoding).encode('utf-8')
+                        break
+                    except UnicodeDecodeError:
+                        continue
+                with open(os.path.join(output_dir, name), 'rb') as f:
+                    if f.read() != expected:
+                        mismatched.append(name)
+            if mismatched:
+                print_colored(f"❌ {label}快照的大文件编码回退结果不一致: {mismatched}", 'red')
+            else:
+                print_colored(f"✅ {label}快照的大文件按整个文件做编码回退", 'green')
+        except Exception as e:
+            print_colored(f"❌ {label}快照的大文件编码回退测试失败: {e}", 'red')
+
+
+def test_non_utf8_line_endings(temp_dir):
+    """测试非UTF-8文本文件走编码回退时保留CRLF换行，压缩与无压缩快照恢复结果一致"""
+    print_colored("\n=== 测试编码回退的换行符 ===", 'blue')
+
+    source_dir = os.path.join(temp_dir, 'crlf_non_utf8')
+    os.makedirs(source_dir, exist_ok=True)
+    content = b'caf\xe9\r\nx\r\n'
+    with open(os.path.join(source_dir, 'crlf.xyz'), 'wb') as f:
+        f.write(content)
+    expected = content.decode('cp1252' if FolderSnapshot.IS_WINDOWS else 'latin1').encode('utf-8')
+
+    snapshots = [
+        ('无压缩', gather_files_to_txt(source_dir), restore_files_from_txt),
+        ('压缩', gather_files_to_txt_compressed(source_dir), restore_files_from_compressed_txt),
+    ]
+    for label, snapshot_path, restore_func in snapshots:
+        output_dir = os.path.join(temp_dir, f'crlf_non_utf8_out_{label}')
+        try:
+            restore_func(str(snapshot_path), output_dir)
+            with open(os.path.join(output_dir, 'crlf.xyz'), 'rb') as f:
+                restored = f.read()
+            if restored == expected:
+                print_colored(f"✅ {label}快照保留了编码回退文件的CRLF换行", 'green')
+            else:
+                print_colored(f"❌ {label}快照的换行符不一致: {restored!r}", 'red')
+        except Exception as e:
+            print_colored(f"❌ {label}快照的换行符测试失败: {e}", 'red')
+
+
+def compare_directory_trees(source_dir, restored_dir):
+    """逐字节比较源目录与恢复目录中的文件，并检查空目录是否恢复，返回不一致的相对路径列表"""
+    mismatched = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        relative_dir = os.path.relpath(dirpath, source_dir)
+        if not dirnames and not filenames and relative_dir != '.':
+            if not os.path.isdir(os.path.join(restored_dir, relative_dir)):
+                mismatched.append(relative_dir)
+        for filename in filenames:
+            relative_path = os.path.normpath(os.path.join(relative_dir, filename))
+            restored_path = os.path.join(restored_dir, relative_path)
+            if not os.path.isfile(restored_path):
+                mismatched.append(relative_path)
+                continue
+            with open(os.path.join(dirpath, filename), 'rb') as f1, open(restored_path, 'rb') as f2:
+                if f1.read() != f2.read():
+                    mismatched.append(relative_path)
+    return mismatched
+
+
+def test_old_format_block_split():
+    """测试旧版本快照的文件块扫描与原来的re.split实现结果一致"""
+    print_colored("\n=== 测试旧版本快照文件块切分 ===", 'blue')
+
+    def split_with_regex(content):
+        # 旧实现：按文件头分割，每块取分隔线之前的部分
+        blocks = re.split(r'=== 文件: (.+?) ===\n', content)[1:]
+        return [(blocks[i], blocks[i + 1].split('\n' + "=" * 50)[0]) for i in range(0, len(blocks) - 1, 2)]
+
+    separator = "=" * 50
+    cases = [
+        '',
+        'no header at all\n',
+        f'=== 文件: a.txt ===\nhello\n{separator}\n\n=== 文件: sub/b.py ===\nprint(1)\n{separator}\n',
+        # 路径为空、文件头跨行、缺少分隔线、内容中出现类似文件头的文本
+        '=== 文件:  ===\nx\n=== 文件: a\nb ===\ny\n',
+        f'=== 文件: last.txt ===\nno separator\n=== 文件: c.txt === tail\n{separator}',
+    ]
+
+    # 由容易引起边界情况的片段随机拼接，固定种子保证结果可复现
+    fragments = ['=== 文件: ', ' ===\n', '=== 文件:  ===\n', 'a', 'b/c.txt', ' ', '\n', separator, '\n' + separator, '=']
+    rng = random.Random(0)
+    cases.extend(''.join(rng.choice(fragments) for _ in range(rng.randint(1, 12))) for _ in range(2000))
+
+    mismatched = [content for content in cases if list(_iter_old_format_blocks(content)) != split_with_regex(content)]
+    if mismatched:
+        print_colored(f"❌ 旧版本快照文件块切分与re.split结果不一致: {mismatched[0]!r}", 'red')
+    else:
+        print_colored(f"✅ 旧版本快照文件块切分与re.split结果一致 ({len(cases)} 个用例)", 'green')
+
+
+def test_scan_tree(temp_dir):
+    """测试目录遍历的条目顺序和空目录检测与os.walk的结果一致（快照中的条目顺序由它决定）"""
+    print_colored("\n=== 测试目录遍历 ===", 'blue')
+
+    source_dir = os.path.join(temp_dir, 'scan_source')
+    for relative_dir in ('b/empty', 'b/c', 'a', 'only_empty_child/inner', 'z_empty'):
+        os.makedirs(os.path.join(source_dir, relative_dir), exist_ok=True)
+    for relative_path in ('root.txt', 'b/2.txt', 'b/1.txt', 'b/c/deep.bin', 'a/x.py', 'Z.md'):
+        with open(os.path.join(source_dir, relative_path), 'wb') as f:
+            f.write(relative_path.encode('utf-8'))
+
+    # 参照结果：按名称排序的os.walk，每个目录先列出文件再进入子目录，没有任何条目的目录记为空目录
+    expected = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        relative_dir = os.path.relpath(dirpath, source_dir).replace(os.sep, '/')
+        prefix = '' if relative_dir == '.' else relative_dir + '/'
+        if not dirnames and not filenames and prefix:
+            expected.append(relative_dir)
+        expected.extend(prefix + filename for filename in sorted(filenames))
+
+    try:
+        scanned = _scan_tree(source_dir, deterministic=True)
+        actual = [relative_path for relative_path, _ in scanned]
+        full_paths_ok = all(os.path.normpath(file_path) == os.path.normpath(os.path.join(source_dir, relative_path))
+                            for relative_path, file_path in scanned)
+        if actual == expected and full_paths_ok:
+            print_colored(f"✅ 目录遍历顺序与os.walk一致 ({len(actual)} 个条目)", 'green')
+        else:
+            print_colored(f"❌ 目录遍历结果与os.walk不一致: {actual} != {expected}", 'red')
+
+        # 不排序时条目集合相同；with_stat返回的stat结果与文件一致
+        unordered = sorted(relative_path for relative_path, _ in _scan_tree(source_dir))
+        with_stat = _scan_tree(source_dir, deterministic=True, with_stat=True)
+        stats_ok = all(st.st_size == os.stat(file_path).st_size for _, file_path, st in with_stat)
+        if unordered == sorted(expected) and [r for r, _, _ in with_stat] == expected and stats_ok:
+            print_colored("✅ 非排序遍历和with_stat遍历结果一致", 'green')
+        else:
+            print_colored("❌ 非排序遍历或with_stat遍历结果不一致", 'red')
+    except Exception as e:
+        print_colored(f"❌ 目录遍历测试失败: {e}", 'red')
+
+
+def test_uncompressed_restore(test_dir, temp_dir):
+    """测试未压缩快照的条目扫描与内存映射恢复：LF/CRLF换行、错误条目、空目录、重复路径，以及与源目录逐字节比较"""
+    print_colored("\n=== 测试未压缩快照恢复 ===", 'blue')
+
+    binary_content = bytes(range(256))
+    entries = [
+        ('@a.txt', b'line1\nline2\n'),
+        # 文件内容中以@开头的普通行不是条目标记
+        ('@style.css', b'@media screen {\n}\n'),
+        ('@empty', b'[EMPTY_DIRECTORY]\n'),
+        ('!bad.txt', b'Permission denied'),
+        ('@dup.txt', b'first\n'),
+        ('@data.bin', b'B\n' + base64.b64encode(binary_content) + b'\n'),
+        # 重复路径：后出现的条目覆盖先出现的
+        ('@dup.txt', b'second\n'),
+    ]
+    snapshot = b'UNCOMPRESSED\n' + b''.join(b'\n' + marker.encode('utf-8') + b'\n' + body + b'\n'
+                                            for marker, body in entries)
+    expected_files = {
+        'a.txt': b'line1\nline2\n',
+        'style.css': b'@media screen {\n}\n',
+        'bad.txt': b'ERROR: Permission denied',
+        'dup.txt': b'second\n',
+        'data.bin': binary_content,
+    }
+
+    # 快照被转换为CRLF换行后，文本文件内容中的换行也随之变为CRLF
+    crlf_expected = {name: content if name == 'data.bin' else content.replace(b'\n', b'\r\n')
+                     for name, content in expected_files.items()}
+    cases = [
+        ('LF', snapshot, expected_files),
+        ('CRLF', snapshot.replace(b'\n', b'\r\n'), crlf_expected),
+    ]
+    for label, snapshot_bytes, expected in cases:
+        snapshot_path = os.path.join(temp_dir, f'restore_{label}.txt')
+        output_dir = os.path.join(temp_dir, f'restore_out_{label}')
+        with open(snapshot_path, 'wb') as f:
+            f.write(snapshot_bytes)
+
+        try:
+            kinds = [(kind, path) for kind, path, _, _ in _iter_snapshot_entries(snapshot_bytes)]
+            expected_kinds = [('text', 'a.txt'), ('text', 'style.css'), ('dir', 'empty'), ('error', 'bad.txt'),
+                              ('text', 'dup.txt'), ('binary', 'data.bin'), ('text', 'dup.txt')]
+            if kinds != expected_kinds:
+                print_colored(f"❌ {label}快照的条目扫描结果不正确: {kinds}", 'red')
+                continue
+
+            restore_files_from_txt(snapshot_path, output_dir)
+            mismatched = []
+            for relative_path, content in expected.items():
+                restored_path = os.path.join(output_dir, relative_path)
+                if not os.path.isfile(restored_path):
+                    mismatched.append(relative_path)
+                    continue
+                with open(restored_path, 'rb') as f:
+                    if f.read() != content:
+                        mismatched.append(relative_path)
+            if not os.path.isdir(os.path.join(output_dir, 'empty')):
+                mismatched.append('empty')
+            if mismatched:
+                print_colored(f"❌ {label}快照恢复结果不一致: {mismatched}", 'red')
+            else:
+                print_colored(f"✅ {label}快照的条目扫描与恢复正确", 'green')
+        except Exception as e:
+            print_colored(f"❌ {label}快照恢复失败: {e}", 'red')
+
+    # 完整流程：创建未压缩快照后恢复，与源目录逐字节比较
+    try:
+        snapshot_path = gather_files_to_txt(test_dir)
+        output_dir = os.path.join(temp_dir, 'restore_out_round_trip')
+        restore_files_from_txt(str(snapshot_path), output_dir)
+        mismatched = compare_directory_trees(test_dir, output_dir)
+        if mismatched:
+            print_colored(f"❌ 未压缩快照恢复结果与源目录不一致: {mismatched}", 'red')
+        else:
+            print_colored("✅ 未压缩快照恢复结果与源目录逐字节一致", 'green')
+    except Exception as e:
+        print_colored(f"❌ 未压缩快照往返测试失败: {e}", 'red')
+
+
+def test_stream_compression_round_trip(temp_dir):
+    """测试流式压缩：大文件分块处理、base64按3字节对齐输出、条目按 目录 -> 文本 -> 二进制 排列"""
+    print_colored("\n=== 测试流式压缩 ===", 'blue')
+
+    source_dir = os.path.join(temp_dir, 'stream_source')
+    os.makedirs(os.path.join(source_dir, 'empty_a'), exist_ok=True)
+    os.makedirs(os.path.join(source_dir, 'nested', 'empty_b'), exist_ok=True)
+    contents = {
+        'small.txt': 'hello\n中文\n'.encode('utf-8'),
+        'nested/style.css': b'@media screen {\n  a { color: red; }\n}\n',
+        # 多字节字符跨越1MB的分块边界
+        'nested/large.txt': '中文'.encode('utf-8') * 400000,
+        # 超过一个base64分块（3MB）且长度不是3的倍数；内容不可压缩，压缩器在flush之前就会分多次输出
+        'large.bin': random.Random(0).randbytes((3 << 20) + 2),
+        'small.bin': b'\x00\x01\x02\x03\xff',
+    }
+    for relative_path, content in contents.items():
+        with open(os.path.join(source_dir, relative_path), 'wb') as f:
+            f.write(content)
+
+    # 调低预读上限和流式压缩阈值，让所有文件都走流式压缩的大文件分支
+    original_prefetch_size = FolderSnapshot.PREFETCH_MAX_FILE_SIZE
+    original_stream_threshold = FolderSnapshot.STREAM_COMPRESSION_THRESHOLD
+    FolderSnapshot.PREFETCH_MAX_FILE_SIZE = 0
+    FolderSnapshot.STREAM_COMPRESSION_THRESHOLD = 1
+    try:
+        snapshot_path = gather_files_to_txt_compressed(source_dir)
+    except Exception as e:
+        print_colored(f"❌ 流式压缩快照创建失败: {e}", 'red')
+        return
+    finally:
+        FolderSnapshot.PREFETCH_MAX_FILE_SIZE = original_prefetch_size
+        FolderSnapshot.STREAM_COMPRESSION_THRESHOLD = original_stream_threshold
+
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            f.readline()
+            payload = f.read()
+
+        # 分段编码的结果拼接后必须是一个完整的base64串，填充只能出现在末尾
+        encoded = payload.split(':', 1)[1]
+        if '=' in encoded.rstrip('='):
+            print_colored("❌ 流式压缩输出的base64中间出现了填充", 'red')
+        else:
+            print_colored("✅ 流式压缩输出的base64按3字节对齐", 'green')
+
+        method, compressed = _decode_compressed_payload(payload)
+        data = _decompress_by_method(method, compressed)
+        order = {'dir': 0, 'text': 1, 'binary': 2}
+        kinds = [kind for kind, _, _, _ in _iter_snapshot_entries(data, has_header=False)]
+        if kinds == sorted(kinds, key=order.get) and len(kinds) == len(contents) + 2:
+            print_colored(f"✅ 流式压缩条目按 目录 -> 文本 -> 二进制 排列 [算法: {method}]", 'green')
+        else:
+            print_colored(f"❌ 流式压缩条目顺序或数量不正确: {kinds}", 'red')
+
+        output_dir = os.path.join(temp_dir, 'stream_out')
+        restore_files_from_compressed_txt(str(snapshot_path), output_dir)
+        mismatched = compare_directory_trees(source_dir, output_dir)
+        if mismatched:
+            print_colored(f"❌ 流式压缩快照恢复结果不一致: {mismatched}", 'red')
+        else:
+            print_colored("✅ 流式压缩快照恢复结果与源目录逐字节一致", 'green')
+    except Exception as e:
+        print_colored(f"❌ 流式压缩快照测试失败: {e}", 'red')
+
+
 def run_comprehensive_test():
     """运行综合测试"""
     print_colored("🧪 开始文件类型兼容性综合测试", 'cyan')
@@ -201,6 +596,27 @@ def run_comprehensive_test():
         # 测试快照创建和验证
         test_snapshot_creation_and_verification(test_dir)
 
+        # 测试压缩格式兼容性
+        test_compressed_format_compatibility(temp_dir)
+
+        # 测试旧版本快照文件块切分
+        test_old_format_block_split()
+
+        # 测试目录遍历
+        test_scan_tree(temp_dir)
+
+        # 测试未压缩快照恢复
+        test_uncompressed_restore(test_dir, temp_dir)
+
+        # 测试流式压缩
+        test_stream_compression_round_trip(temp_dir)
+
+        # 测试编码回退的换行符
+        test_non_utf8_line_endings(temp_dir)
+
+        # 测试大文件编码回退
+        test_large_non_utf8_text_round_trip(temp_dir)
+
     print_colored("\n🎉 综合测试完成！", 'cyan')
 
 